@@ -0,0 +1,71 @@
+"""
+Compares end-to-end latency of single-shot and chunked (map-reduce) extraction.
+
+    python -m benchmarks.chunked_extraction report.pdf --year 2024 [--window-tokens 30000] [--workers 4]
+    python -m benchmarks.chunked_extraction --fake --pages 600 --year 2024
+
+With a PDF it needs GEMINI_API_KEY. With --fake the pages are synthetic and the model is a local
+fake whose latency grows with prompt size (--base-latency + --latency-per-ktoken per 1000 tokens),
+which is roughly how the real API behaves.
+"""
+import argparse
+import time
+
+from benchmarks.fake_llm import fake_registry
+from utils.context import CHARS_PER_TOKEN
+from utils.llm import SINGLE_SHOT_CHARS, GeminiModel
+from utils.parser import PDF_WORKERS, parse_pdf
+
+
+def synthetic_pages(count, chars_per_page=3000):
+    filler = "Particulars Note 2024 2023 " * (chars_per_page // 27)
+    return [f"Page {i + 1}\n{filler}" for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_path", nargs="?")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--window-tokens", type=int, default=30_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--fake", action="store_true")
+    parser.add_argument("--pages", type=int, default=600)
+    parser.add_argument("--base-latency", type=float, default=0.5)
+    parser.add_argument("--latency-per-ktoken", type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.fake:
+        pages = synthetic_pages(args.pages)
+        registry = fake_registry(args.workers, base_latency=args.base_latency, latency_per_ktoken=args.latency_per_ktoken)
+        model = GeminiModel(registry=registry)
+    elif args.pdf_path:
+        pages = [p for p in parse_pdf(args.pdf_path, workers=PDF_WORKERS) if p]
+        model = GeminiModel()
+    else:
+        parser.error("pass a PDF path or --fake")
+
+    chars = sum(len(p) for p in pages)
+    print(f"{len(pages)} pages, {chars:,} chars (~{chars // CHARS_PER_TOKEN:,} tokens)")
+
+    start = time.perf_counter()
+    single = model.process_pdf_pages(pages, args.year, top_k=None, chunked=False)
+    single_time = time.perf_counter() - start
+    sent = min(model.last_locator_stats["chars_out"], SINGLE_SHOT_CHARS)
+
+    start = time.perf_counter()
+    chunked = model.process_pdf_pages_chunked(pages, args.year, window_tokens=args.window_tokens, workers=args.workers)
+    chunked_time = time.perf_counter() - start
+    stats = model.last_chunk_stats
+
+    print(f"single-shot  {single_time:7.2f}s  (sent {sent:,} of {chars:,} chars)")
+    print(f"chunked      {chunked_time:7.2f}s  ({stats['windows']} windows, {stats['failed_windows']} failed, "
+          f"slowest window {max(stats['window_seconds'], default=0):.2f}s)")
+    if "error" in single or "error" in chunked:
+        print("extraction failed:", single.get("error") or chunked.get("error"))
+        return
+    if stats.get("conflicts"):
+        print(f"conflicting values resolved for {len(stats['conflicts'])} metrics")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares the hybrid table-first extraction with the LLM-only path on one report.
+
+    python -m benchmarks.extraction report.pdf --year 2024 [--truth expected.json]
+
+Needs GEMINI_API_KEY. With --truth (a JSON object of REQUIRED_KEYS -> expected value) each path is
+scored by the share of metrics within 0.5% of the expected value; without it the two paths are
+compared with each other.
+"""
+import argparse
+import json
+import time
+
+from utils.llm import REQUIRED_KEYS, GeminiModel
+from utils.parser import PDF_WORKERS, parse_pdf
+
+
+def matches(actual, expected, tolerance=0.005):
+    if actual is None or expected is None:
+        return actual is None and expected is None
+    try:
+        actual, expected = float(actual), float(expected)
+    except (TypeError, ValueError):
+        return False
+    return abs(actual - expected) <= tolerance * max(abs(expected), 1e-9)
+
+
+def accuracy(data, truth):
+    return sum(matches(data.get(key), truth.get(key)) for key in REQUIRED_KEYS) / len(REQUIRED_KEYS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_path")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--truth")
+    args = parser.parse_args()
+
+    pages = parse_pdf(args.pdf_path, workers=PDF_WORKERS, keep_empty=True)
+    model = GeminiModel()
+
+    start = time.perf_counter()
+    llm_only = model.process_pdf_pages([p for p in pages if p], args.year)
+    llm_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hybrid = model.extract_financials(args.pdf_path, pages, args.year)
+    hybrid_time = time.perf_counter() - start
+    sources = model.last_extraction_sources or {}
+
+    print(f"LLM only  {llm_time:7.2f}s")
+    print(f"hybrid    {hybrid_time:7.2f}s  ({sum(1 for s in sources.values() if s == 'tables')} of {len(REQUIRED_KEYS)} metrics from tables)")
+    if "error" in llm_only or "error" in hybrid:
+        print("extraction failed:", llm_only.get("error") or hybrid.get("error"))
+        return
+
+    if args.truth:
+        with open(args.truth) as f:
+            truth = json.load(f)
+        print(f"accuracy  LLM only {accuracy(llm_only, truth):.0%}  hybrid {accuracy(hybrid, truth):.0%}")
+    else:
+        print(f"agreement {accuracy(hybrid, llm_only):.0%}")
+
+    for key in REQUIRED_KEYS:
+        print(f"  {key:30} {str(llm_only.get(key)):>16} {str(hybrid.get(key)):>16}  {sources.get(key, '')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+A local stand-in for the Gemini SDK, pluggable into utils.llm.ModelRegistry through model_factory.
+Latency grows with prompt size and a share of calls can be rejected with 429s.
+
+    registry = fake_registry(base_latency=0.5, latency_per_ktoken=0.01)
+    model = GeminiModel(registry=registry)
+"""
+import json
+import random
+import threading
+import time
+
+from utils.context import estimate_tokens
+from utils.llm import ModelRegistry
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeContent:
+    def __init__(self, role, text):
+        self.role = role
+        self.parts = [FakeResponse(text)]
+
+
+class FakeChatSession:
+    """Enough of genai.ChatSession for GeminiModel: history, send_message and streaming."""
+
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = history or []
+
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, turns):
+        # Like the SDK, accept {"role", "parts"} dicts (from add_to_history or trim_history) and store content objects.
+        self._history = [FakeContent(t["role"], t["parts"][0]) if isinstance(t, dict) else t for t in turns]
+
+    def rewind(self):
+        return self._history.pop(-2), self._history.pop()
+
+    def send_message(self, prompt, generation_config=None, stream=False):
+        text = self.model.generate_content(prompt, generation_config).text
+        self.history = list(self.history) + [FakeContent("user", prompt), FakeContent("model", text)]
+        if not stream:
+            return FakeResponse(text)
+        return [FakeResponse(text[i:i + 20]) for i in range(0, len(text), 20)]
+
+
+class FakeModel:
+    """
+    Stands in for GenerativeModel. Extraction prompts get values for every REQUIRED_KEYS metric
+    mentioned in the prompt, chat prompts a short JSON reply.
+    """
+
+    def __init__(self, base_latency=0.2, latency_per_ktoken=0.0, rate_limit=0.0, seed=0, keys=None):
+        from utils.llm import REQUIRED_KEYS
+
+        self.base_latency = base_latency
+        self.latency_per_ktoken = latency_per_ktoken
+        self.rate_limit = rate_limit
+        self.keys = keys or REQUIRED_KEYS
+        self.calls = 0
+        self.rejected = 0
+        self.prompt_tokens = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += tokens
+            reject = self._rng.random() < self.rate_limit
+            if reject:
+                self.rejected += 1
+            values = {key: round(self._rng.uniform(1, 1000), 2) for key in self.keys if key in prompt}
+        time.sleep(self.base_latency + self.latency_per_ktoken * tokens / 1000)
+        if reject:
+            raise RateLimited("429 Resource has been exhausted")
+        if "Each value must be an object" in prompt:
+            return FakeResponse(json.dumps({
+                key: {"value": value, "confidence": 0.9, "statement": "consolidated"} for key, value in values.items()
+            }))
+        if "USER PROMPT:" in prompt or not values:
+            return FakeResponse(json.dumps({"message": "The company grew steadily over the period."}))
+        return FakeResponse(json.dumps(values))
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+
+def fake_registry(max_concurrent=4, requests_per_minute=6000, **model_options):
+    """A ModelRegistry whose models are all one shared FakeModel (available as registry.fake)."""
+    fake = FakeModel(**model_options)
+    registry = ModelRegistry(max_concurrent, requests_per_minute, model_factory=lambda name, system_instruction=None: fake)
+    registry.fake = fake
+    return registry
@@ -0,0 +1,40 @@
+"""
+Compares serial and parallel PDF text extraction.
+
+    python -m benchmarks.parse_pdf [path.pdf] --workers 4 --repeat 3
+"""
+import argparse
+import time
+
+from utils.parser import PDF_WORKERS, parse_pdf
+
+
+def time_parse(pdf_path, workers, repeat):
+    timings = []
+    pages = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages = parse_pdf(pdf_path, workers=workers)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings), pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_path", nargs="?", default="financia_report.pdf")
+    parser.add_argument("--workers", type=int, default=PDF_WORKERS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    serial_best, serial_mean, serial_pages = time_parse(args.pdf_path, 1, args.repeat)
+    parallel_best, parallel_mean, parallel_pages = time_parse(args.pdf_path, args.workers, args.repeat)
+
+    print(f"{args.pdf_path}: {len(serial_pages or [])} pages with text")
+    print(f"serial           best {serial_best:.3f}s  mean {serial_mean:.3f}s")
+    print(f"parallel ({args.workers} workers) best {parallel_best:.3f}s  mean {parallel_mean:.3f}s")
+    print(f"speedup          {serial_best / parallel_best:.2f}x")
+    print(f"identical output {serial_pages == parallel_pages}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+End-to-end benchmark of the hot paths on synthetic inputs, with a fake LLM backend so no API key
+or network is needed. Writes a JSON report (latency, throughput and peak traced memory per stage)
+and can compare it with an earlier report to catch regressions.
+
+    python -m benchmarks.run --output report.json
+    python -m benchmarks.run --pages 300 --companies 500 --years 30 --baseline report.json
+
+Every stage is timed --repeat times and then run once more under tracemalloc for its peak memory.
+With --baseline, a stage regresses when its best time or peak memory is more than --threshold
+(default 20%) above the baseline; the exit status is 1 if any stage regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_llm import fake_registry
+from benchmarks.synthetic import financial_records, seed_companies, write_report_pdf
+
+STAGES = []
+
+
+def stage(name):
+    def register(fn):
+        STAGES.append((name, fn))
+        return fn
+    return register
+
+
+def measure(fn, repeat):
+    """Returns (timings, items, peak_bytes) for fn() -> items processed."""
+    timings = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return timings, items, peak
+
+
+class Context:
+    """Inputs shared by the stages, built once per run."""
+
+    def __init__(self, args, workdir):
+        from utils.database import Database
+        from utils.llm import GeminiModel
+        from utils.parser import parse_pdf
+
+        self.args = args
+        self.pdf_path = os.path.join(workdir, "report.pdf")
+        self.truth = write_report_pdf(self.pdf_path, args.pages, args.year, args.seed)
+        self.pages = parse_pdf(self.pdf_path, workers=args.workers, keep_empty=True)
+        self.registry = fake_registry(args.llm_concurrency, base_latency=args.llm_latency, latency_per_ktoken=args.llm_latency_per_ktoken)
+        self.model = GeminiModel(registry=self.registry)
+        self.db = Database("benchmark", db_path=os.path.join(workdir, "data", "benchmark.db"))
+        self.db.setup_database()
+        seed_companies(self.db, args.companies)
+        self.records = list(financial_records(args.companies, args.years, seed=args.seed))
+        self.db.save_financial_records(self.records)
+        self.company_ids = list(range(1, args.companies + 1))
+
+
+@stage("parse_pdf.serial")
+def parse_serial(ctx):
+    from utils.parser import parse_pdf
+    return len(parse_pdf(ctx.pdf_path, workers=1, keep_empty=True))
+
+
+@stage("parse_pdf.parallel")
+def parse_parallel(ctx):
+    from utils.parser import parse_pdf
+    return len(parse_pdf(ctx.pdf_path, workers=ctx.args.workers, keep_empty=True))
+
+
+@stage("locator.select")
+def locate(ctx):
+    from utils.llm import page_locator
+    page_locator.select(ctx.pages)
+    return len(ctx.pages)
+
+
+@stage("process_pdf_pages")
+def process_pages(ctx):
+    ctx.model.process_pdf_pages(ctx.pages, ctx.args.year)
+    return 1
+
+
+@stage("process_pdf_pages_chunked")
+def process_pages_chunked(ctx):
+    ctx.model.process_pdf_pages_chunked(ctx.pages, ctx.args.year)
+    return 1
+
+
+@stage("extract_financials")
+def extract(ctx):
+    ctx.model.extract_financials(ctx.pdf_path, ctx.pages, ctx.args.year)
+    return 1
+
+
+@stage("save_financial_records")
+def save(ctx):
+    ctx.db.save_financial_records(ctx.records)
+    return sum(len(metrics) for _, _, metrics in ctx.records)
+
+
+@stage("get_company_financials")
+def read_rows(ctx):
+    for company_id in ctx.company_ids:
+        ctx.db.get_company_financials(company_id)
+    return len(ctx.company_ids)
+
+
+@stage("get_financials_snapshot")
+def read_snapshots(ctx):
+    for company_id in ctx.company_ids:
+        ctx.db.get_financials_snapshot(company_id)
+    return len(ctx.company_ids)
+
+
+@stage("group_cube")
+def group_cube(ctx):
+    from utils.analytics import FinancialCube
+    cube = FinancialCube(ctx.db.get_group_frame(ctx.company_ids))
+    cube.peer_comparison("Net Profit")
+    return len(ctx.company_ids)
+
+
+@stage("plot_builders")
+def plots(ctx):
+    from utils.plot import PLOT_BUILDERS
+    snapshot = ctx.db.get_financials_snapshot(ctx.company_ids[0])
+    for builder in PLOT_BUILDERS.values():
+        builder(snapshot, "Revenue from Operations", "Revenue")
+    return len(PLOT_BUILDERS)
+
+
+@stage("chat_stream")
+def chat(ctx):
+    snapshot = ctx.db.get_financials_snapshot(ctx.company_ids[0])
+    ctx.model.start_chat_session([])
+    for _ in ctx.model.chat_stream("How did revenue develop?", snapshot, ("benchmark", ctx.company_ids[0], 0)):
+        pass
+    return 1
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """Prints each stage against the baseline and returns the names of the stages that regressed."""
+    if baseline["meta"]["params"] != report["meta"]["params"]:
+        print("warning: baseline was run with different parameters; ratios are not comparable")
+    regressed = []
+    print(f"\n{'stage':28} {'time':>10} {'baseline':>10} {'ratio':>7} {'memory':>7}")
+    for name, result in report["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            print(f"{name:28} {result['best_seconds']:10.4f} {'-':>10}")
+            continue
+        time_ratio = result["best_seconds"] / base["best_seconds"] if base["best_seconds"] else 1.0
+        memory_ratio = result["peak_memory_bytes"] / base["peak_memory_bytes"] if base["peak_memory_bytes"] else 1.0
+        flag = ""
+        if time_ratio > 1 + threshold or memory_ratio > 1 + threshold:
+            regressed.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:28} {result['best_seconds']:10.4f} {base['best_seconds']:10.4f} {time_ratio:7.2f} {memory_ratio:7.2f}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--companies", type=int, default=200)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency-per-ktoken", type=float, default=0.001)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", help="comma-separated stage names (default: all)")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    selected = [(name, fn) for name, fn in STAGES if not args.stages or name in args.stages.split(",")]
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "threshold", "stages")}
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": params,
+        },
+        "stages": {},
+    }
+
+    repo_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # Keep the run's database and extraction cache out of the repo and out of the configured data
+        # directory, where benchmark.db would otherwise show up as a group.
+        os.makedirs(os.path.join(workdir, "data"))
+        os.environ["FINANCIA_DATA_DIR"] = os.path.join(workdir, "data")
+        os.environ.setdefault("FINANCIA_CACHE_DIR", os.path.join(workdir, "cache"))
+        os.chdir(workdir)
+        try:
+            print(f"Preparing inputs: {args.pages}-page report, {args.companies} companies x {args.years} years")
+            ctx = Context(args, workdir)
+            for name, fn in selected:
+                timings, items, peak = measure(lambda: fn(ctx), args.repeat)
+                best = min(timings)
+                report["stages"][name] = {
+                    "runs": len(timings),
+                    "best_seconds": round(best, 6),
+                    "mean_seconds": round(sum(timings) / len(timings), 6),
+                    "items": items,
+                    "items_per_second": round(items / best, 2) if best else None,
+                    "peak_memory_bytes": peak,
+                }
+                print(f"{name:28} best {best:8.4f}s  {items / best if best else 0:12.1f} items/s  peak {peak / 2**20:8.2f} MiB")
+        finally:
+            os.chdir(repo_dir)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = compare(report, baseline, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} stage(s) regressed by more than {args.threshold:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Synthetic inputs for the benchmarks: multi-hundred-page financial report PDFs written by a small
+hand-rolled PDF writer (no extra dependencies), and large financial_data tables.
+
+    python -m benchmarks.synthetic report.pdf --pages 300 --year 2024
+"""
+import argparse
+import json
+import random
+
+from utils.llm import REQUIRED_KEYS
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+FONT_SIZE = 9
+LEADING = 12
+
+STATEMENTS = [
+    ("Consolidated Balance Sheet as at 31st March", [
+        "Non-current assets", "Current assets", "Total Assets", "Total Equity",
+        "Non-current liabilities", "Current liabilities", "Total Liabilities", "Cash and cash equivalents",
+    ]),
+    ("Consolidated Statement of Profit and Loss for the year ended 31st March", [
+        "Revenue from Operations", "Other Income", "Total Income", "Profit Before Tax",
+        "Net Profit", "Earnings Per Share (Basic)",
+    ]),
+]
+
+NOTE_WORDS = (
+    "the company group segment revenue operations during year management board directors risk "
+    "capital expenditure subsidiaries joint ventures accounting policies fair value deferred tax "
+    "provisions contingent liabilities borrowings lease impairment goodwill dividend reserves"
+).split()
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text_ops(x, y, text):
+    return f"BT /F1 {FONT_SIZE} Tf {x} {y} Td ({_escape(text)}) Tj ET"
+
+
+def _note_page(rng, page_number, lines=40):
+    ops = [_text_ops(40, PAGE_HEIGHT - 50, f"Notes to the financial statements - page {page_number}")]
+    y = PAGE_HEIGHT - 70
+    for _ in range(lines):
+        ops.append(_text_ops(40, y, " ".join(rng.choice(NOTE_WORDS) for _ in range(14))))
+        y -= LEADING
+    return "\n".join(ops)
+
+
+def _statement_page(title, year, rows):
+    """A ruled three-column table (label, year, year - 1), so pdfplumber's line strategy finds it."""
+    ops = [
+        _text_ops(40, PAGE_HEIGHT - 50, f"{title} {year}"),
+        _text_ops(40, PAGE_HEIGHT - 64, "(All amounts in Rs. crore, unless otherwise stated)"),
+    ]
+    columns = [40, 330, 445, 555]
+    row_height = 20
+    top = PAGE_HEIGHT - 90
+    table = [("Particulars", str(year), str(year - 1))] + rows
+    bottom = top - row_height * len(table)
+    for i in range(len(table) + 1):
+        y = top - i * row_height
+        ops.append(f"{columns[0]} {y} m {columns[-1]} {y} l S")
+    for x in columns:
+        ops.append(f"{x} {top} m {x} {bottom} l S")
+    for i, cells in enumerate(table):
+        y = top - (i + 1) * row_height + 6
+        for x, cell in zip(columns, cells):
+            ops.append(_text_ops(x + 4, y, cell))
+    return "\n".join(ops)
+
+
+def _format_amount(value):
+    return f"({abs(value):,.2f})" if value < 0 else f"{value:,.2f}"
+
+
+def report_values(year, seed=0):
+    """The figures a synthetic report states for year and year - 1, keyed like REQUIRED_KEYS."""
+    rng = random.Random(seed)
+    values = {}
+    for key in REQUIRED_KEYS:
+        base = rng.uniform(50, 500) if key == "Earnings Per Share (Basic)" else rng.uniform(1_000, 900_000)
+        values[key] = {year: round(base, 2), year - 1: round(base * rng.uniform(0.8, 1.1), 2)}
+    return values
+
+
+def write_report_pdf(path, pages=300, year=2024, seed=0):
+    """
+    Writes a report of `pages` pages: notes pages with the two statements placed in the middle.
+    Returns the expected {key: value} for `year`.
+    """
+    rng = random.Random(seed)
+    values = report_values(year, seed)
+    statement_at = {pages // 2: STATEMENTS[0], pages // 2 + 1: STATEMENTS[1]}
+    contents = []
+    for number in range(1, pages + 1):
+        if number in statement_at:
+            title, keys = statement_at[number]
+            rows = [(key, _format_amount(values[key][year]), _format_amount(values[key][year - 1])) for key in keys]
+            contents.append(_statement_page(title, year, rows))
+        else:
+            contents.append(_note_page(rng, number))
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page.
+    objects = [None, None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for content in contents:
+        page_id, content_id = len(objects) + 1, len(objects) + 2
+        kids.append(f"{page_id} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        stream = content.encode("latin-1")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{content}\nendstream")
+    objects[0] = "<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+    return {key: values[key][year] for key in REQUIRED_KEYS}
+
+
+def financial_records(companies, years, metrics=None, seed=0, start_year=2000):
+    """(company_id, year, metrics) records for save_financial_records, for company ids 1..companies."""
+    rng = random.Random(seed)
+    metrics = metrics or REQUIRED_KEYS
+    for company_id in range(1, companies + 1):
+        for year in range(start_year, start_year + years):
+            yield company_id, year, {metric: round(rng.uniform(-1_000, 900_000), 2) for metric in metrics}
+
+
+def seed_companies(db, companies):
+    """Adds companies 1..companies to the group database; existing ids are left as they are."""
+    with db.get_db_connection() as conn:
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO companies (id, name, group_name) VALUES (?, ?, ?)",
+                [(i, f"Company {i:04d}", db.group_name) for i in range(1, companies + 1)]
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_path")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    truth = write_report_pdf(args.pdf_path, args.pages, args.year, args.seed)
+    print(json.dumps(truth, indent=2))
+
+
+if __name__ == "__main__":
+    main()
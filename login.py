@@ -1,5 +1,5 @@
 import streamlit as st
-from utils.database import Database
+from utils.shards import list_groups, router
 from utils.auth import logout_button
 
 st.set_page_config(
@@ -7,15 +7,13 @@ st.set_page_config(
     layout="centered"
 )
 
-group = st.selectbox("select the parent group",["reliance","tata"]) 
+group = st.selectbox("select the parent group", list_groups()) 
 st.session_state["group_name"] = group
 
 if not ("group_name" in st.session_state or st.session_state['group_name'] == group):
     st.error("select group") 
 
-group_db = Database(group)  
-
-group_db.setup_database()
+group_db = router.get(group)
 
 st.write("Please log in to continue.")
 
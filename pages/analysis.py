@@ -1,15 +1,12 @@
 import streamlit as st
-import pandas as pd
 import json
+import pandas as pd
 from utils.auth import check_login, logout_button
-from utils.database import Database
-from utils.llm import GeminiModel
-from utils.plot import (
-    create_line_chart,
-    create_bar_chart,
-    create_asset_liability_chart,
-    create_growth_chart
-)
+from utils.shards import list_groups, router
+from utils.cache import get_accessible_companies, get_company_ratios, get_company_snapshot
+from utils.response_cache import response_cache
+from utils.llm import GeminiModel, registry
+from utils.plot import render_plot
 
 st.set_page_config(page_title="AI Financial Analyst", page_icon="🤖", layout="wide")
 
@@ -19,16 +16,19 @@ if "model" not in st.session_state:
 model = st.session_state.model
 
 if "group_name" not in st.session_state or not st.session_state["group_name"]:
-    group_name = st.selectbox("select the group", ["reliance", "tata"])
+    group_name = st.selectbox("select the group", list_groups())
     st.session_state["group_name"] = group_name
 else:
     group_name = st.session_state["group_name"]
 
-group_db = Database(group_name)
+group_db = router.get(group_name)
 
 check_login()
 logout_button()
 
+with st.sidebar.expander("Gemini usage"):
+    st.json(registry.metrics())
+
 st.title("Financial Analysis with Gemini-1.5-flash")
 st.markdown("Select a company to review its financial snapshot and receive expert analysis with your AI partner.")
 st.divider()
@@ -36,7 +36,7 @@ st.divider()
 user_id = st.session_state["user_id"]
 role = st.session_state["role"]
 
-accessible_companies = group_db.get_user_accessible_companies(user_id, role)
+accessible_companies = get_accessible_companies(group_db, user_id, role)
 
 if not accessible_companies:
     st.warning("You do not have access to any companies. Please contact an administrator.")
@@ -50,18 +50,25 @@ if not selected_company_name:
     st.stop()
 selected_company_id = company_options[selected_company_name]
 
-financial_records = group_db.get_company_financials(selected_company_id)
-if not financial_records:
+# One version read keys both cache lookups and the chat, so they all describe the same data.
+data_version = group_db.data_version(selected_company_id)
+snapshot_df, _ = get_company_snapshot(group_db, selected_company_id, data_version)
+if snapshot_df.empty:
     st.error(f"No financial data found for {selected_company_name}. Please upload a financial report for this company first.")
     st.stop()
 
-df = pd.DataFrame(financial_records, columns=['year', 'metric', 'value'])
 st.header(f"Financial Snapshot: {selected_company_name}")
-snapshot_df = df.pivot_table(index='metric', columns='year', values='value').sort_index()
 st.dataframe(snapshot_df.style.format("{:,.2f}", na_rep="-"), use_container_width=True)
-st.divider()
 
-data_summary = snapshot_df.to_string()
+ratios_df = get_company_ratios(group_db, selected_company_id, data_version)
+if not ratios_df.empty:
+    st.subheader("Key Ratios and Growth")
+    st.dataframe(ratios_df.style.format("{:,.2f}", na_rep="-"), use_container_width=True)
+
+# Charts and the chat read the raw metrics together with the precomputed ratios and growth.
+analysis_df = pd.concat([snapshot_df, ratios_df]) if not ratios_df.empty else snapshot_df
+data_key = (group_name, selected_company_id, data_version)
+st.divider()
 
 st.title(f"💬 Chat with Expert assistant")
 
@@ -72,32 +79,24 @@ if st.session_state.get("company_id") != selected_company_id:
     # Pass the initial history to start the new chat session
     model.start_chat_session(st.session_state.messages)
 
+# Only the most recent plots are drawn on every rerun; older ones render when switched on.
+RECENT_PLOTS = 3
+plot_messages = [i for i, m in enumerate(st.session_state.messages) if m["content"].get("plot_request")]
+recent_plots = set(plot_messages[-RECENT_PLOTS:])
+
 # Display chat messages from history
-for message in st.session_state.messages:
+for i, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         content = message["content"]
         if "message" in content and content["message"]:
             st.markdown(content["message"])
 
-        # Logic for displaying plots from historical messages
-        if "plot_request" in content and content.get("plot_request"):
-            plot_info = content["plot_request"]
-            # ... (plotting logic is the same)
-            plot_type = plot_info.get("type")
-            metric = plot_info.get("metric")
-            title = plot_info.get("title")
-            fig = None
-            if plot_type == "line":
-                fig = create_line_chart(snapshot_df, metric, title)
-            elif plot_type == "bar":
-                fig = create_bar_chart(snapshot_df, metric, title)
-            elif plot_type == "asset_liability_comparison":
-                fig = create_asset_liability_chart(snapshot_df, title)
-            elif plot_type == "growth":
-                fig = create_growth_chart(snapshot_df, metric, title)
-
-            if fig:
-                st.plotly_chart(fig, use_container_width=True)
+        # Figures are memoized by plot request and data version, so replaying history is cheap
+        if content.get("plot_request"):
+            if i in recent_plots or st.toggle("Show chart", key=f"show_plot_{selected_company_id}_{i}"):
+                fig = render_plot(analysis_df, content["plot_request"], data_key)
+                if fig:
+                    st.plotly_chart(fig, use_container_width=True, key=f"plot_{selected_company_id}_{i}")
 
 
 if prompt := st.chat_input(f"Ask about {selected_company_name}'s financial performace"):
@@ -107,40 +106,33 @@ if prompt := st.chat_input(f"Ask about {selected_company_name}'s financial perfo
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("AI is thinking..."):
-            # The model now handles greetings, analysis, and context internally
-            # We check for keywords to decide if the detailed data_summary is needed
-            # analysis_keywords = ['analyze', 'revenue', 'profit', 'growth', 'compare', 'show me']
-            # should_send_data = any(keyword in prompt.lower() for keyword in analysis_keywords)
-            
-            summary_to_send = data_summary 
-            
-            response_dict = model.chat_with_gemini(prompt, summary_to_send)
-            response_content = response_dict
-
-            if "message" in response_dict and response_dict["message"]:
+        cached_response = response_cache.get(data_key, prompt)
+        if cached_response is not None:
+            response_dict = cached_response
+            if response_dict.get("message"):
                 st.markdown(response_dict["message"])
-
-            # Logic for plotting the new response
-            if "plot_request" in response_dict and response_dict.get("plot_request"):
-                plot_info = response_dict["plot_request"]
-                plot_type = plot_info.get("type")
-                metric = plot_info.get("metric")
-                title = plot_info.get("title")
-                fig = None
-
-                if plot_type == "line":
-                    fig = create_line_chart(snapshot_df, metric, title)
-                elif plot_type == "bar":
-                    fig = create_bar_chart(snapshot_df, metric, title)
-                elif plot_type == "asset_liability_comparison":
-                    fig = create_asset_liability_chart(snapshot_df, title)
-                elif plot_type == "growth":
-                    fig = create_growth_chart(snapshot_df, metric, title)
-
-                if fig:
-                    st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.warning(f"Could not generate plot for metric: '{metric}'. Please ensure it's in the data table.")
+            st.caption("Answered from an earlier reply to the same question about this data.")
+            model.add_to_history(prompt, response_dict)
+        else:
+            # The snapshot is sent once per chat session and afterwards only when it changes
+            st.write_stream(model.chat_stream(prompt, analysis_df, data_key))
+            response_dict = model.last_response
+            stats = model.last_prompt_stats
+            ttft = f"{stats['ttft_seconds']:.2f}s" if stats["ttft_seconds"] is not None else "-"
+            st.caption(
+                f"First token after {ttft}, total {stats['total_seconds']:.2f}s · "
+                f"prompt ~{stats['prompt_tokens']} tokens (data: {stats['data']}), history ~{stats['history_tokens']} tokens"
+            )
+            if "error" not in response_dict:
+                response_cache.put(data_key, prompt, response_dict)
+        response_content = response_dict
+
+        # Logic for plotting the new response
+        if response_dict.get("plot_request"):
+            fig = render_plot(analysis_df, response_dict["plot_request"], data_key)
+            if fig:
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.warning(f"Could not generate plot for metric: '{response_dict['plot_request'].get('metric')}'. Please ensure it's in the data table.")
 
     st.session_state.messages.append({"role": "assistant", "content": response_content}) 
\ No newline at end of file
@@ -0,0 +1,85 @@
+import streamlit as st
+from utils.auth import check_login, logout_button
+from utils.shards import list_groups, router
+from utils.cache import get_accessible_companies, get_group_cube
+from utils.plot import (
+    create_multi_line_chart,
+    create_multi_bar_chart,
+    create_multi_asset_liability_chart,
+    create_multi_growth_chart
+)
+
+# Charts stay readable (and fast) with hundreds of companies by plotting the leaders only by default.
+DEFAULT_CHART_COMPANIES = 10
+
+st.set_page_config(page_title="Group Dashboard", page_icon="📊", layout="wide")
+
+if "group_name" not in st.session_state or not st.session_state["group_name"]:
+    group_name = st.selectbox("select the group", list_groups())
+    st.session_state["group_name"] = group_name
+else:
+    group_name = st.session_state["group_name"]
+
+group_db = router.get(group_name)
+
+check_login()
+logout_button()
+
+st.title(f"Group Dashboard: {group_name.title()}")
+st.markdown("Compare every company you have access to side by side.")
+st.divider()
+
+accessible_companies = get_accessible_companies(group_db, st.session_state["user_id"], st.session_state["role"])
+if not accessible_companies:
+    st.warning("You do not have access to any companies. Please contact an administrator.")
+    st.stop()
+
+cube = get_group_cube(group_db, accessible_companies)
+if cube.empty:
+    st.info("No financial data has been uploaded for these companies yet.")
+    st.stop()
+
+col1, col2 = st.columns(2)
+metric = col1.selectbox("Metric", cube.metrics, index=cube.metrics.index("Revenue from Operations") if "Revenue from Operations" in cube.metrics else 0)
+year_options = ["Latest available"] + cube.years[::-1]
+year_choice = col2.selectbox("Year", year_options)
+year = None if year_choice == "Latest available" else year_choice
+
+st.header("Peer Comparison")
+peers = cube.peer_comparison(metric, year)
+if peers.empty:
+    st.info(f"No company reports {metric} for {year_choice}.")
+    st.stop()
+st.dataframe(
+    peers.style.format({metric: "{:,.2f}", "Percentile": "{:.0f}", "vs Median %": "{:+.1f}", "Z-Score": "{:+.2f}"}, na_rep="-"),
+    use_container_width=True, hide_index=True
+)
+
+st.header("Trends")
+ids_by_name = dict(zip(cube.companies, cube.company_ids))
+leaders = peers["Company"].head(DEFAULT_CHART_COMPANIES).tolist()
+selected_names = st.multiselect("Companies to plot", options=cube.companies, default=leaders)
+selected_ids = [ids_by_name[name] for name in selected_names]
+if not selected_ids:
+    st.stop()
+
+metric_df = cube.metric_frame(metric, selected_ids)
+tab_line, tab_bar, tab_growth, tab_balance = st.tabs(["Trend", "By year", "Growth", "Assets vs Liabilities"])
+with tab_line:
+    st.plotly_chart(create_multi_line_chart(metric_df, metric, f"{metric} by company"), use_container_width=True)
+with tab_bar:
+    st.plotly_chart(create_multi_bar_chart(metric_df, metric, f"{metric} by year"), use_container_width=True)
+with tab_growth:
+    # Prefer the precomputed YoY series, which skips gaps between reported years.
+    if f"{metric} YoY %" in cube.metrics:
+        growth_fig = create_multi_growth_chart(cube.metric_frame(f"{metric} YoY %", selected_ids), f"{metric} YoY %", f"{metric} YoY growth")
+    else:
+        growth_fig = create_multi_growth_chart(metric_df, metric, f"{metric} YoY growth")
+    st.plotly_chart(growth_fig, use_container_width=True)
+with tab_balance:
+    balance_year = year or cube.years[-1]
+    fig = create_multi_asset_liability_chart(cube.year_frame(balance_year, selected_ids), f"Assets vs Liabilities ({balance_year})")
+    if fig:
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("Total Assets and Total Liabilities are not available for these companies.")
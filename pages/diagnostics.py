@@ -0,0 +1,56 @@
+import streamlit as st
+import pandas as pd
+
+from utils.auth import check_role_access, logout_button
+from utils.tracing import tracer
+from utils.llm import registry
+
+st.set_page_config(page_title="Diagnostics", page_icon="🩺", layout="wide")
+
+check_role_access(["analyst"])
+logout_button()
+
+st.title("🩺 Diagnostics")
+st.markdown("Where the time goes in uploads and analysis: timed spans for PDF parsing, AI calls and database work.")
+
+enabled = st.toggle(
+    "Tracing enabled", value=tracer.enabled,
+    help="Applies to the whole app process. Start the app with FINANCIA_TRACE=1 to trace from startup, and set FINANCIA_TRACE_FILE to also append spans to a JSON-lines file."
+)
+if enabled != tracer.enabled:
+    tracer.enabled = enabled
+    st.rerun()
+
+col1, col2 = st.columns(2)
+col1.download_button("Download spans (JSONL)", tracer.to_jsonl(), file_name="financia_trace.jsonl", mime="application/jsonl")
+if col2.button("Clear"):
+    tracer.clear()
+    st.rerun()
+
+st.header("Counters")
+counters = tracer.counters()
+if counters:
+    st.dataframe(pd.DataFrame(sorted(counters.items()), columns=["counter", "value"]), hide_index=True, use_container_width=True)
+else:
+    st.info("No counters recorded yet.")
+
+st.header("Spans by name")
+summary = tracer.summary()
+if summary:
+    st.dataframe(
+        pd.DataFrame(summary, columns=["name", "count", "total_ms", "mean_ms", "max_ms", "errors"]),
+        hide_index=True, use_container_width=True
+    )
+else:
+    st.info("No spans recorded yet. Enable tracing and upload a report or ask a question.")
+
+st.header("Recent spans")
+recent = tracer.recent(200)[::-1]
+if recent:
+    st.dataframe(
+        pd.DataFrame(recent, columns=["id", "parent_id", "name", "duration_ms", "thread", "error", "attrs"]).astype({"attrs": str}),
+        hide_index=True, use_container_width=True
+    )
+
+with st.expander("Gemini usage"):
+    st.json(registry.metrics())
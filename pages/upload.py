@@ -1,23 +1,20 @@
 import streamlit as st
-import os
-import requests
-from bs4 import BeautifulSoup 
+import pandas as pd
 
 from utils.auth import logout_button, check_login
-from utils.database import Database
-from utils.parser import parse_pdf
-from utils.llm import GeminiModel
+from utils.shards import list_groups, router
+from utils.extraction_cache import extraction_cache
+from utils.jobs import batch_summary, enqueue_batch, enqueue_job, get_worker_pool, list_jobs, parse_manifest, store_upload
 
 st.set_page_config(page_title="Upload Balance Sheet", page_icon="📤", layout="wide") 
 
 if not "group_name" in st.session_state:
-    group = st.selectbox("enter the group",["reliance","tata"])
+    group = st.selectbox("enter the group", list_groups())
     st.error("select group") 
 else:
     group = st.session_state["group_name"]
 
-group_db = Database(group) 
-model = GeminiModel()
+group_db = router.get(group)
 
 check_login()
 logout_button()
@@ -30,84 +27,120 @@ if user_role != "analyst":
     st.error("Access Denied, you must login as analyst to upload files")
     st.stop()
 
+# Starts this group's background workers once per process.
+get_worker_pool(group)
+
 st.title("📤 Upload Financial Report")
 
 companies = group_db.get_all_companies()
 
 st.write(f"As an analyst for the **{group}** group, you can upload annual financial reports for the following companies.")
 
-source_format = st.selectbox("select your source format", ["pdf","web link"]) 
-
-
-with st.form("upload_form", clear_on_submit=True):
-    company_list = {c['name']: c['id'] for c in companies}
-
-    selected_company_name = st.selectbox("Select Company", options=company_list.keys())
-    year = st.number_input("Enter the Financial Year (e.g., 2023)", min_value=1950, max_value=2050, step=1, value=2023) 
+source_format = st.selectbox("select your source format", ["pdf","web link","bulk"]) 
+
+company_list = {c['name']: c['id'] for c in companies}
+
+if source_format == "bulk":
+    st.write(
+        "Queue many reports at once. Describe them with `company`, `year` and `source` columns, either in a "
+        "manifest CSV or in the table below; `source` is the name of an uploaded PDF or a web link."
+    )
+    with st.form("bulk_form", clear_on_submit=True):
+        bulk_files = st.file_uploader("Choose PDF files", type="pdf", accept_multiple_files=True)
+        manifest_file = st.file_uploader("Manifest CSV (optional)", type="csv")
+        manifest_rows = st.data_editor(
+            pd.DataFrame({"company": pd.Series(dtype=str), "year": pd.Series(dtype=int), "source": pd.Series(dtype=str)}),
+            column_config={"company": st.column_config.SelectboxColumn(options=list(company_list.keys()), required=True)},
+            num_rows="dynamic",
+            use_container_width=True,
+        )
+        bulk_submitted = st.form_submit_button("Queue all")
+
+    if bulk_submitted:
+        manifest_text = manifest_file.getvalue().decode("utf-8") if manifest_file else manifest_rows.to_csv(index=False)
+        items, errors = parse_manifest(manifest_text, company_list)
+        files_by_name = {f.name: f for f in bulk_files or []}
+        queued = []
+        for item in items:
+            if item["source_type"] == "pdf":
+                uploaded = files_by_name.get(item["source"])
+                if uploaded is None:
+                    errors.append(f"'{item['source']}' is not among the uploaded files")
+                    continue
+                item["source"] = store_upload(uploaded.getvalue())
+            queued.append(item)
+        for error in errors:
+            st.warning(error)
+        if queued:
+            st.session_state["bulk_batch_id"] = enqueue_batch(group_db, queued, created_by=st.session_state.get("username"))
+            st.success(f"Queued {len(queued)} reports.")
+
+    if "bulk_batch_id" in st.session_state:
+
+        @st.fragment(run_every=2)
+        def show_batch():
+            summary = batch_summary(group_db, st.session_state["bulk_batch_id"])
+            cols = st.columns(4)
+            cols[0].metric("Finished", f"{summary['finished']} / {summary['total']}")
+            cols[1].metric("Failed", summary["counts"].get("failed", 0))
+            cols[2].metric("Elapsed", f"{summary['elapsed']:.0f}s")
+            cols[3].metric("Throughput", f"{summary['docs_per_minute']:.1f} docs/min")
+            st.dataframe(
+                [
+                    {"Job": job["id"], "Source": job["source_name"], "Year": job["year"], "Status": job["status"], "Message": job["message"]}
+                    for job in summary["jobs"]
+                ],
+                hide_index=True,
+                use_container_width=True,
+            )
+
+        show_batch()
+else:
+    with st.form("upload_form", clear_on_submit=True):
+        selected_company_name = st.selectbox("Select Company", options=company_list.keys())
+        year = st.number_input("Enter the Financial Year (e.g., 2023)", min_value=1950, max_value=2050, step=1, value=2023) 
 
-    if source_format == "pdf":
-        uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
-    else:
-        url = st.text_input("enter the url")
+        if source_format == "pdf":
+            uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
+        else:
+            url = st.text_input("enter the url")
 
-    submitted = st.form_submit_button("Process and Save Data")
+        submitted = st.form_submit_button("Process and Save Data")
 
 if source_format == "pdf" and submitted and uploaded_file is not None and year and selected_company_name:
     company_id = company_list[selected_company_name] 
-
-    with st.spinner(f"Processing '{uploaded_file.name}' for {year}... This may take several minutes."):
-        save_path = os.path.join("files", uploaded_file.name)
-        with open(save_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-
-        st.info("Step 1: Extracting text from PDF...")
-        pages = parse_pdf(save_path)
-
-        if not pages:
-            st.error("Failed to extract any text from the PDF. The document might be scanned, encrypted or corrupted.")
-            os.remove(save_path)
-            st.stop()
-
-        st.success(f"Text extraction complete. Found {len(pages)} pages with text.")
-
-        st.info("Step 2: Analyzing pages with AI to extract financial data...") 
-
-        financial_data = model.process_pdf_pages(pages, year)
-        st.write(financial_data)
-
-        os.remove(save_path)
-
-        if "error" in financial_data:
-            st.error(f"AI Analysis Failed: {financial_data['error']}")
-        else:
-            st.info("Step 3: Saving extracted data to the database...")
-            group_db.save_financial_data(company_id, year, metrics= financial_data, source_document=uploaded_file.name)
-            st.success(f"Successfully processed and saved") 
+    source_path = store_upload(uploaded_file.getvalue())
+    job_id = enqueue_job(group_db, company_id, year, "pdf", source_path, uploaded_file.name, created_by=st.session_state.get("username"))
+    st.success(f"Queued '{uploaded_file.name}' for {selected_company_name} ({year}) as job #{job_id}. You can keep working while it is processed.")
 
 elif source_format == "web link" and submitted and year and selected_company_name:
     company_id = company_list[selected_company_name] 
-    with st.spinner("Extracting and Processing the data in the given web page, this may take several minutes"):
-        try:
-            st.info("Extracting the data from the web page")
-            response = requests.get(url)
-            response.raise_for_status()  
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            text = soup.get_text(separator='\n')  
-
-            cleaned_text = '\n'.join(line.strip() for line in text.split('\n') if line.strip()) 
-            st.success("Extraction Completed") 
-
-            financial_data = model.structure_data_with_gemini(cleaned_text,year)
-            st.write(financial_data) 
-
-            if "error" in financial_data:
-                st.error(f"AI Analysis Failed: {financial_data['error']}")
-            else:
-                st.info("Step 3: Saving extracted data to the database...")
-                group_db.save_financial_data(company_id, year, metrics= financial_data, source_document= f'web source of {selected_company_name}' )
-                st.success(f"Successfully processed and saved")
-
-        except requests.exceptions.RequestException as e:
-            st.error("fetch error") 
\ No newline at end of file
+    job_id = enqueue_job(group_db, company_id, year, "url", url, f'web source of {selected_company_name}', created_by=st.session_state.get("username"))
+    st.success(f"Queued the web page for {selected_company_name} ({year}) as job #{job_id}.")
+
+
+@st.fragment(run_every=2)
+def show_jobs():
+    st.subheader("Your processing jobs")
+    jobs = list_jobs(group_db, created_by=st.session_state.get("username"))
+    if not jobs:
+        st.caption("No jobs yet.")
+        return
+    st.dataframe(
+        [
+            {
+                "Job": job["id"], "Source": job["source_name"], "Year": job["year"], "Status": job["status"],
+                "Stage": job["stage"], "Progress": job["progress"], "Attempts": job["attempts"], "Message": job["message"],
+            }
+            for job in jobs
+        ],
+        column_config={"Progress": st.column_config.ProgressColumn(min_value=0, max_value=1)},
+        hide_index=True,
+        use_container_width=True,
+    )
+
+
+show_jobs()
+
+with st.sidebar.expander("Extraction cache"):
+    st.json(extraction_cache.stats())
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from utils.context import trim_history
+
+
+def content(role, text):
+    return SimpleNamespace(role=role, parts=[SimpleNamespace(text=text)])
+
+
+def roles(history):
+    return [turn["role"] for turn in history]
+
+
+def alternates(roles):
+    return all(a != b for a, b in zip(roles, roles[1:]))
+
+
+def test_trim_history_alternates_after_seeded_greeting():
+    # The analysis page seeds the session with the assistant's greeting, so the history starts with a model turn.
+    history = [content("model", "Hello! Ask me about the company.")]
+    for i in range(10):
+        history += [content("user", f"question {i} " + "x" * 400), content("model", f"answer {i} " + "y" * 400)]
+
+    for keep_turns in range(1, 9):
+        new_history, trimmed = trim_history(history, budget=100, keep_turns=keep_turns)
+        assert new_history is not None
+        assert roles(new_history)[:2] == ["user", "model"]
+        assert alternates(roles(new_history)), (keep_turns, roles(new_history))
+        assert trimmed + len(new_history) - 2 == len(history)
+
+
+def test_trim_history_alternates_when_history_starts_with_user():
+    history = []
+    for i in range(10):
+        history += [content("user", f"question {i} " + "x" * 400), content("model", f"answer {i} " + "y" * 400)]
+
+    for keep_turns in range(1, 9):
+        new_history, _ = trim_history(history, budget=100, keep_turns=keep_turns)
+        assert alternates(roles(new_history)), (keep_turns, roles(new_history))
+
+
+def test_trim_history_within_budget_is_unchanged():
+    history = [content("model", "hi"), content("user", "q"), content("model", "a")]
+    assert trim_history(history, budget=1000) == (None, 0)
@@ -0,0 +1,73 @@
+import json
+
+import pandas as pd
+
+from utils.jsonstream import StringFieldParser
+
+
+def stream(raw, size):
+    parser = StringFieldParser("message")
+    streamed = "".join(parser.feed(raw[i:i + size]) for i in range(0, len(raw), size))
+    return parser, streamed
+
+
+def test_message_decoded_across_any_chunking():
+    reply = {"message": 'Line 1\nTab\there "quoted" \\ slash/ café \U0001F4C8 done', "plot_request": {"type": "line"}}
+    raw = json.dumps(reply)  # ensure_ascii: the accent and the emoji (a surrogate pair) arrive as \u escapes
+    for size in range(1, 12):
+        parser, streamed = stream(raw, size)
+        assert streamed == reply["message"], size
+        assert parser.result() == reply
+
+
+def test_message_after_other_fields_and_nested_keys():
+    raw = '{"plot_request": {"message": "not this"}, "items": ["message"], "message": "this"}'
+    parser, streamed = stream(raw, 3)
+    assert streamed == "this"
+    assert parser.result()["plot_request"] == {"message": "not this"}
+
+
+def test_missing_message_field():
+    parser, streamed = stream('{"plot_request": null}', 4)
+    assert streamed == ""
+    assert parser.result() == {"plot_request": None}
+
+
+def test_truncated_reply_falls_back_to_streamed_text():
+    parser, streamed = stream('{"message": "half a sent', 5)
+    assert streamed == "half a sent"
+    assert parser.result() == {"message": "half a sent"}
+
+
+def test_non_object_payload_becomes_an_error_reply():
+    parser, streamed = stream('["not", "an", "object"]', 4)
+    assert streamed == ""
+    result = parser.result()
+    assert result["message"] == '["not", "an", "object"]'
+    assert "list" in result["error"]
+
+    parser, _ = stream('"just text"', 4)
+    assert parser.result() == {"message": "just text", "error": "expected a JSON object, got str"}
+
+
+class ListReplySession:
+    """A chat session whose model answers with a JSON list."""
+
+    def __init__(self):
+        self.history = []
+
+    def send_message(self, prompt, generation_config=None, stream=False):
+        chunk = type("Chunk", (), {"text": "[1, 2, 3]"})()
+        return [chunk]
+
+
+def test_chat_stream_survives_non_object_reply():
+    from benchmarks.fake_llm import fake_registry
+    from utils.llm import GeminiModel
+
+    model = GeminiModel(registry=fake_registry())
+    model.chat_session = ListReplySession()
+    snapshot = pd.DataFrame({2024: [1.0]}, index=["Net Profit"])
+    streamed = "".join(model.chat_stream("how did we do?", snapshot, ("group", 1, 0)))
+    assert streamed == "[1, 2, 3]"
+    assert model.last_response["error"] == "expected a JSON object, got list"
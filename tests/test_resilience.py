@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from benchmarks.fake_llm import RateLimited, fake_registry
+from utils.resilience import CircuitOpen
+
+
+class ServerError(Exception):
+    code = 503
+
+
+def quick_registry(**model_options):
+    registry = fake_registry(4, 60000, **model_options)
+    registry.caller.sleep = lambda seconds: None
+    registry.caller.rate_limit_pause = 0.0
+    return registry
+
+
+def generate(registry, prompt="Net Profit"):
+    model = registry.get_model()
+    return lambda: model.generate_content(prompt).text
+
+
+def test_rate_limited_calls_are_retried_until_they_succeed():
+    registry = quick_registry(base_latency=0.0, rate_limit=0.5, seed=3)
+    caller = registry.caller
+    caller.max_attempts = 20
+
+    for _ in range(10):
+        assert "Net Profit" in caller.call(generate(registry))
+
+    assert registry.fake.rejected > 0
+    assert caller.rate_limited == registry.fake.rejected
+    assert caller.retries == registry.fake.rejected
+    assert registry.fake.calls == 10 + registry.fake.rejected
+
+
+def test_rate_limit_burst_does_not_open_the_circuit():
+    registry = quick_registry(base_latency=0.0, rate_limit=1.0)
+    caller = registry.caller
+
+    for _ in range(caller.breaker.failure_threshold * 2):
+        with pytest.raises(RateLimited):
+            caller.call(generate(registry))
+
+    assert caller.breaker.state == "closed"
+    registry.fake.rate_limit = 0.0
+    assert "Net Profit" in caller.call(generate(registry))
+
+
+def test_server_errors_open_the_circuit():
+    registry = quick_registry()
+    caller = registry.caller
+    caller.max_attempts = 1
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ServerError("503 unavailable")
+
+    for _ in range(caller.breaker.failure_threshold):
+        with pytest.raises(ServerError):
+            caller.call(failing)
+    assert caller.breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        caller.call(failing)
+    assert len(calls) == caller.breaker.failure_threshold
+
+
+def test_bad_requests_are_not_retried():
+    registry = quick_registry()
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise ValueError("invalid prompt")
+
+    with pytest.raises(ValueError):
+        registry.caller.call(bad_request)
+    assert len(calls) == 1
+    assert registry.caller.retries == 0
+
+
+def test_identical_concurrent_requests_share_one_upstream_call():
+    registry = quick_registry(base_latency=0.2)
+    callers = 12
+    barrier = threading.Barrier(callers)
+    results = [None] * callers
+
+    def request(i):
+        barrier.wait()
+        results[i] = registry.caller.call_once(("window", "same text", 2024), generate(registry))
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert registry.fake.calls == 1
+    assert registry.caller.coalescer.coalesced == callers - 1
+    assert len(set(results)) == 1 and results[0] is not None
+
+
+def test_distinct_requests_are_not_coalesced():
+    registry = quick_registry(base_latency=0.0)
+    for i in range(3):
+        registry.caller.call_once(("window", i), generate(registry))
+    assert registry.fake.calls == 3
+    assert registry.caller.coalescer.coalesced == 0
@@ -0,0 +1,115 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.locator import build_lexicon
+from utils.web import ResponseTooLarge, TableExtractor, fetch_financial_tables, looks_financial
+
+KEYS = ["Revenue from Operations", "Net Profit", "Total Assets", "Total Liabilities"]
+
+REPORT_PAGE = """<html><head><title>Annual report</title>
+<script>var rows = "<table><tr><td>Net Profit</td><td>1</td></tr></table>";</script></head>
+<body>
+<table class="nav"><tr><td>Home</td><td>Investors</td><td>Contact</td></tr></table>
+<p>Statement of profit and loss (in crore)</p>
+<table>
+  <tr><th>Particulars</th><th>2024</th><th>2023</th></tr>
+  <tr><td>Revenue from Operations</td><td>1,234.50</td><td>1,100.00</td></tr>
+  <tr><td>Net&nbsp;Profit</td><td>(56.70)</td><td>80.25</td></tr>
+  <tr><td>Total Assets</td><td>9,876</td><td>9,000</td></tr>
+</table>
+</body></html>"""
+
+TEXT_PAGE = "<html><body><h1>Results</h1><p>Revenue from operations grew to 1,234 crore.</p></body></html>"
+
+PAGES = {
+    "/report": REPORT_PAGE.encode("utf-8"),
+    "/text": TEXT_PAGE.encode("utf-8"),
+    "/large": b"<html><body>" + b"<p>padding</p>" * 2000 + b"</body></html>",
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"  # lets /large-unsized end the body by closing the connection
+
+    def do_GET(self):
+        path = self.path.replace("-unsized", "")
+        body = PAGES.get(path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if not self.path.endswith("-unsized"):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_keeps_only_financial_tables(server):
+    page = fetch_financial_tables(f"{server}/report", KEYS)
+
+    assert page["tables_seen"] == 2
+    assert page["tables_kept"] == 1
+    assert page["tables"][0] == [
+        ["Particulars", "2024", "2023"],
+        ["Revenue from Operations", "1,234.50", "1,100.00"],
+        ["Net Profit", "(56.70)", "80.25"],
+        ["Total Assets", "9,876", "9,000"],
+    ]
+    assert page["text"].splitlines()[1] == "Revenue from Operations | 1,234.50 | 1,100.00"
+    assert "Home" not in page["text"] and "var rows" not in page["text"]
+    assert page["bytes"] == len(PAGES["/report"])
+    assert len(page["content_hash"]) == 64
+
+
+def test_falls_back_to_visible_text_without_financial_tables(server):
+    page = fetch_financial_tables(f"{server}/text", KEYS)
+
+    assert page["tables_kept"] == 0
+    assert page["text"] == "Results\nRevenue from operations grew to 1,234 crore."
+
+
+def test_looks_financial():
+    lexicon = build_lexicon(KEYS)
+    financial = [["Particulars", "2024"], ["Net Profit", "12.5"], ["Total Assets", "(3,400)"]]
+    navigation = [["Home", "Investors", "Contact"]]
+    words_only = [["Net Profit", "grew"], ["Total Assets", "fell"]]
+
+    assert looks_financial(financial, lexicon)
+    assert not looks_financial(navigation, lexicon)
+    assert not looks_financial(words_only, lexicon)
+    assert not looks_financial([], lexicon)
+
+
+def test_declared_size_over_limit_is_rejected(server):
+    with pytest.raises(ResponseTooLarge, match="byte limit"):
+        fetch_financial_tables(f"{server}/large", KEYS, max_bytes=1024)
+
+
+def test_streamed_size_over_limit_is_rejected(server):
+    with pytest.raises(ResponseTooLarge, match="exceeded"):
+        fetch_financial_tables(f"{server}/large-unsized", KEYS, max_bytes=1024)
+
+
+def test_parser_handles_tags_split_across_chunks():
+    parser = TableExtractor()
+    html = REPORT_PAGE
+    for i in range(0, len(html), 7):
+        parser.feed(html[i:i + 7])
+    parser.close()
+    assert parser.tables[1][2] == ["Net Profit", "(56.70)", "80.25"]
@@ -0,0 +1,192 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+DERIVED_COLUMNS = ["company_id", "year", "metric", "value"]
+
+# name -> (numerator, denominator, scale). Total Liabilities stands in for debt, which is not extracted.
+RATIOS = {
+    "Current Ratio": ("Current assets", "Current liabilities", 1),
+    "Debt to Equity": ("Total Liabilities", "Total Equity", 1),
+    "Net Margin %": ("Net Profit", "Revenue from Operations", 100),
+    "ROE %": ("Net Profit", "Total Equity", 100),
+    "ROA %": ("Net Profit", "Total Assets", 100),
+}
+
+YOY_METRICS = ["Revenue from Operations", "Net Profit", "Total Assets", "Total Equity", "Earnings Per Share (Basic)"]
+CAGR_METRICS = ["Revenue from Operations", "Net Profit"]
+
+
+def compute_derived_metrics(frame):
+    """
+    Computes ratios, YoY growth and CAGR for every company in a long (company_id, year, metric, value)
+    frame in one vectorized pass. YoY is only reported between consecutive years; CAGR runs from each
+    company's first year with a positive value. Returns a long frame with the same columns.
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=DERIVED_COLUMNS)
+
+    wide = frame.pivot_table(index=["company_id", "year"], columns="metric", values="value", aggfunc="last").sort_index()
+    companies = wide.index.get_level_values("company_id").to_numpy()
+    years = wide.index.get_level_values("year").to_numpy()
+    year_series = pd.Series(years, index=wide.index, dtype="float64")
+    derived = {}
+
+    for name, (numerator, denominator, scale) in RATIOS.items():
+        if numerator in wide and denominator in wide:
+            derived[name] = wide[numerator] / wide[denominator].where(wide[denominator] != 0) * scale
+
+    # Row i-1 is the previous year of the same company only when the company matches and the gap is one year.
+    previous_is_last_year = np.zeros(len(wide), dtype=bool)
+    previous_is_last_year[1:] = (companies[1:] == companies[:-1]) & (years[1:] - years[:-1] == 1)
+    for metric in YOY_METRICS:
+        if metric not in wide:
+            continue
+        values = wide[metric]
+        previous = values.groupby(level="company_id").shift(1)
+        growth = (values - previous) / previous.abs().where(previous != 0) * 100
+        derived[f"{metric} YoY %"] = growth.where(previous_is_last_year)
+
+    for metric in CAGR_METRICS:
+        if metric not in wide:
+            continue
+        values = wide[metric].where(wide[metric] > 0)
+        first_year = year_series.where(values.notna()).groupby(level="company_id").transform("min")
+        first_value = values.groupby(level="company_id").transform("first")
+        periods = year_series - first_year
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cagr = ((values / first_value) ** (1 / periods) - 1) * 100
+        derived[f"{metric} CAGR %"] = cagr.where(periods > 0)
+
+    if not derived:
+        return pd.DataFrame(columns=DERIVED_COLUMNS)
+    result = pd.DataFrame(derived).replace([np.inf, -np.inf], np.nan).reset_index()
+    long = result.melt(id_vars=["company_id", "year"], var_name="metric", value_name="value").dropna(subset=["value"])
+    return long[DERIVED_COLUMNS].reset_index(drop=True)
+
+
+def refresh_derived_metrics(conn, company_ids=None):
+    """
+    Recomputes derived_metrics for the given companies (all of them when None) from financial_data.
+    Runs inside the caller's transaction, so it can be part of the write that changed the data.
+    Returns the number of rows written.
+    """
+    # Accepts a connection or a cursor; a fresh cursor without a row factory keeps reads cheap.
+    connection = getattr(conn, "connection", conn)
+    cursor = connection.cursor()
+    cursor.row_factory = None
+    if company_ids is None:
+        cursor.execute("SELECT company_id, year, metric, value FROM financial_data")
+    else:
+        ids = json.dumps(sorted({int(c) for c in company_ids}))
+        cursor.execute(
+            "SELECT company_id, year, metric, value FROM financial_data WHERE company_id IN (SELECT value FROM json_each(?))",
+            (ids,)
+        )
+    frame = pd.DataFrame.from_records(cursor.fetchall(), columns=DERIVED_COLUMNS)
+    derived = compute_derived_metrics(frame)
+
+    if company_ids is None:
+        cursor.execute("DELETE FROM derived_metrics")
+    else:
+        cursor.execute("DELETE FROM derived_metrics WHERE company_id IN (SELECT value FROM json_each(?))", (ids,))
+    computed_at = time.time()
+    cursor.executemany(
+        "INSERT INTO derived_metrics (company_id, year, metric, value, computed_at) VALUES (?, ?, ?, ?, ?)",
+        [
+            (int(company_id), int(year), metric, float(value), computed_at)
+            for company_id, year, metric, value in derived.itertuples(index=False)
+        ]
+    )
+    return len(derived)
+
+
+class FinancialCube:
+    """
+    A dense company x metric x year array built from a long (company_id, year, metric, value) frame
+    in one vectorized step, with name-labelled slices and peer comparisons on top of it.
+    """
+
+    def __init__(self, frame, company_names=None):
+        company_codes, company_ids = pd.factorize(frame["company_id"], sort=True)
+        metric_codes, metrics = pd.factorize(frame["metric"], sort=True)
+        year_codes, years = pd.factorize(frame["year"], sort=True)
+        self.company_ids = [int(c) for c in company_ids]
+        self.metrics = list(metrics)
+        self.years = [int(y) for y in years]
+        names = company_names or {}
+        self.companies = [names.get(c, str(c)) for c in self.company_ids]
+        self.values = np.full((len(self.company_ids), len(self.metrics), len(self.years)), np.nan)
+        self.values[company_codes, metric_codes, year_codes] = frame["value"].to_numpy(dtype=float)
+
+    @property
+    def empty(self):
+        return self.values.size == 0
+
+    def metric_frame(self, metric, company_ids=None):
+        """company x year DataFrame of one metric."""
+        rows = self._rows(company_ids)
+        return pd.DataFrame(
+            self.values[rows, self.metrics.index(metric), :],
+            index=[self.companies[i] for i in rows], columns=self.years
+        )
+
+    def year_frame(self, year, company_ids=None):
+        """company x metric DataFrame of one year."""
+        rows = self._rows(company_ids)
+        return pd.DataFrame(
+            self.values[rows, :, self.years.index(year)],
+            index=[self.companies[i] for i in rows], columns=self.metrics
+        )
+
+    def latest(self, metric):
+        """(values, years) of each company's most recent non-null value of a metric; NaN/-1 if none."""
+        series = self.values[:, self.metrics.index(metric), :]
+        present = ~np.isnan(series)
+        last = series.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1)
+        has_any = present.any(axis=1)
+        values = np.where(has_any, series[np.arange(len(series)), last], np.nan)
+        years = np.where(has_any, np.asarray(self.years)[last], -1)
+        return values, years
+
+    def peer_comparison(self, metric, year=None, company_ids=None):
+        """
+        Ranks companies on one metric for a year (or each company's latest year when None), with
+        percentile, difference from the peer median and z-score. Companies without a value are left out.
+        """
+        rows = self._rows(company_ids)
+        if year is None:
+            values, years = self.latest(metric)
+            values, years = values[rows], years[rows]
+        else:
+            values = self.values[rows, self.metrics.index(metric), self.years.index(year)]
+            years = np.full(len(rows), year)
+
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return pd.DataFrame(columns=["Company", "Year", metric, "Rank", "Percentile", "vs Median %", "Z-Score"])
+        values, years = values[valid], years[valid]
+        names = [self.companies[i] for i, ok in zip(rows, valid) if ok]
+        median = np.median(values)
+        std = values.std()
+        order = (-values).argsort(kind="stable")
+        ranks = np.empty(len(values), dtype=int)
+        ranks[order] = np.arange(1, len(values) + 1)
+        result = pd.DataFrame({
+            "Company": names,
+            "Year": years,
+            metric: values,
+            "Rank": ranks,
+            "Percentile": (len(values) - ranks) / (len(values) - 1) * 100 if len(values) > 1 else 100.0,
+            "vs Median %": (values - median) / abs(median) * 100 if median else np.nan,
+            "Z-Score": (values - values.mean()) / std if std else 0.0,
+        })
+        return result.sort_values("Rank").reset_index(drop=True)
+
+    def _rows(self, company_ids):
+        if company_ids is None:
+            return list(range(len(self.company_ids)))
+        wanted = {int(c) for c in company_ids}
+        return [i for i, c in enumerate(self.company_ids) if c in wanted]
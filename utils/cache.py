@@ -0,0 +1,145 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import FinancialCube
+
+
+def estimate_size(value):
+    """Rough in-memory size of a cached value, in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, FinancialCube):
+        return int(value.values.nbytes) + estimate_size(value.metrics) + estimate_size(value.companies)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """A thread-safe LRU cache bounded by entry count and approximate memory use, with an optional TTL."""
+
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self.bytes -= self._entries.pop(key)[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._entries[key] = (value, size, expires_at)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def discard_where(self, predicate):
+        """Removes every entry whose key matches the predicate."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+snapshot_cache = LRUCache(max_entries=256, max_bytes=128 * 1024 * 1024)
+
+
+def _cached(key, loader):
+    value = snapshot_cache.get(key)
+    if value is None:
+        value = loader()
+        snapshot_cache.put(key, value)
+        # Older versions of the same entry can never be hit again.
+        snapshot_cache.discard_where(lambda k: k[:-1] == key[:-1] and k[-1] != key[-1])
+    return value
+
+
+def get_company_snapshot(db, company_id, version=None):
+    """
+    Returns (snapshot_df, data_summary) for a company, keyed by its data version so that
+    any save_financial_data write for the company invalidates it. Pass `version` when the caller
+    has already read it. Treat the result as read-only.
+    """
+    def load():
+        snapshot_df = db.get_financials_snapshot(company_id)
+        return snapshot_df, snapshot_df.to_string()
+
+    if version is None:
+        version = db.data_version(company_id)
+    return _cached(("snapshot", db.DB_PATH, company_id, version), load)
+
+
+def get_company_ratios(db, company_id, version=None):
+    """Precomputed ratios and growth of a company (metric x year), cached like the snapshot."""
+    if version is None:
+        version = db.data_version(company_id)
+    return _cached(("ratios", db.DB_PATH, company_id, version), lambda: db.get_derived_snapshot(company_id))
+
+
+def get_group_cube(db, companies):
+    """
+    FinancialCube over the given companies (dicts with id and name), keyed by every company's data
+    version so a write to any of them rebuilds it. Treat the result as read-only.
+    """
+    ids = tuple(sorted(c["id"] for c in companies))
+    names = {c["id"]: c["name"] for c in companies}
+    versions = tuple(db.data_versions(ids))
+    return _cached(("cube", db.DB_PATH, ids, versions), lambda: FinancialCube(db.get_group_frame(ids), names))
+
+
+def get_accessible_companies(db, user_id, role):
+    """Cached get_user_accessible_companies, invalidated when the companies table changes."""
+    def load():
+        return [dict(c) for c in db.get_user_accessible_companies(user_id, role)]
+
+    return _cached(("companies", db.DB_PATH, user_id, role, db.data_version()), load)
@@ -0,0 +1,90 @@
+from utils.context import CHARS_PER_TOKEN, estimate_tokens
+
+PAGE_SEPARATOR = "\n\n--- PAGE BREAK ---\n\n"
+
+# Per-window token budget; well under the model's context so each call stays fast.
+WINDOW_TOKENS = 30_000
+CHUNK_WORKERS = 4
+
+# Statement basis preference when windows disagree.
+BASIS_RANK = {"consolidated": 2, "standalone": 1}
+DEFAULT_CONFIDENCE = 0.5
+
+
+def page_windows(pages, max_tokens=WINDOW_TOKENS, page_numbers=None):
+    """
+    Packs consecutive pages into windows of at most max_tokens, returning a list of
+    (page_numbers, text). A single page larger than the budget is split on its own.
+    """
+    page_numbers = page_numbers or list(range(1, len(pages) + 1))
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    windows = []
+    numbers, parts, tokens = [], [], 0
+
+    def flush():
+        if parts:
+            windows.append((numbers[:], PAGE_SEPARATOR.join(parts)))
+            numbers.clear()
+            parts.clear()
+
+    for number, text in zip(page_numbers, pages):
+        page_tokens = estimate_tokens(text)
+        if page_tokens > max_tokens:
+            flush()
+            tokens = 0
+            for start in range(0, len(text), max_chars):
+                windows.append(([number], text[start:start + max_chars]))
+            continue
+        if parts and tokens + page_tokens > max_tokens:
+            flush()
+            tokens = 0
+        numbers.append(number)
+        parts.append(text)
+        tokens += page_tokens
+    flush()
+    return windows
+
+
+def normalize_candidate(raw):
+    """Accepts {"value", "confidence", "statement"} objects or bare values from a window reply."""
+    if isinstance(raw, dict):
+        value = raw.get("value")
+        try:
+            confidence = float(raw.get("confidence", DEFAULT_CONFIDENCE))
+        except (TypeError, ValueError):
+            confidence = DEFAULT_CONFIDENCE
+        statement = str(raw.get("statement") or "").lower()
+    else:
+        value, confidence, statement = raw, DEFAULT_CONFIDENCE, ""
+    if value is None:
+        return None
+    return {"value": value, "confidence": confidence, "statement": statement}
+
+
+def merge_candidates(window_results, keys):
+    """
+    Picks one value per key from the per-window candidates, preferring consolidated statements,
+    then the highest confidence, then the earliest window. Returns (data, conflicts) where
+    conflicts maps each key whose windows disagreed to the distinct values seen. Results that are
+    not JSON objects (a list or string reply) carry no candidates and are skipped.
+    """
+    window_results = [result for result in window_results if isinstance(result, dict)]
+    data, conflicts = {}, {}
+    for key in keys:
+        candidates = []
+        for index, result in enumerate(window_results):
+            candidate = normalize_candidate(result.get(key))
+            if candidate is not None:
+                candidates.append((index, candidate))
+        if not candidates:
+            data[key] = None
+            continue
+        _, best = max(
+            candidates,
+            key=lambda item: (BASIS_RANK.get(item[1]["statement"], 0), item[1]["confidence"], -item[0])
+        )
+        data[key] = best["value"]
+        values = {str(candidate["value"]) for _, candidate in candidates}
+        if len(values) > 1:
+            conflicts[key] = sorted(values)
+    return data, conflicts
@@ -0,0 +1,104 @@
+import math
+
+CHARS_PER_TOKEN = 4
+TOKEN_BUDGET = 6000
+KEEP_TURNS = 6
+SUMMARY_CHARS_PER_TURN = 160
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (about four characters per token) used for budgeting."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def format_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "-"
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def compact_encoding(snapshot_df):
+    """
+    Renders a metric x year snapshot as one line per metric with comma-separated values,
+    which is far shorter than the padded to_string() table.
+    """
+    years = ",".join(str(year) for year in snapshot_df.columns)
+    lines = [f"metric|{years}"]
+    for metric, row in snapshot_df.iterrows():
+        lines.append(f"{metric}|" + ",".join(format_value(v) for v in row.tolist()))
+    return "\n".join(lines)
+
+
+def snapshot_delta(old_df, new_df):
+    """Lists the cells that were added or changed between two snapshots as metric@year=value lines."""
+    changes = []
+    for metric, row in new_df.iterrows():
+        for year, value in row.items():
+            if value is None or value != value:
+                continue
+            old = old_df.at[metric, year] if metric in old_df.index and year in old_df.columns else None
+            if old is None or old != old or old != value:
+                changes.append(f"{metric}@{year}={format_value(value)}")
+    return "\n".join(changes)
+
+
+class ChatContext:
+    """
+    Tracks which financial data a chat session has already seen, so the full snapshot is sent
+    once and later turns only carry changes (or nothing at all).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.data_key = None
+        self.snapshot_df = None
+
+    def prepare(self, snapshot_df, data_key):
+        """Returns (data_text, kind) for the next turn; kind is "full", "delta" or "none"."""
+        if self.data_key is None or self.snapshot_df is None:
+            kind, text = "full", compact_encoding(snapshot_df)
+        elif data_key != self.data_key:
+            delta = snapshot_delta(self.snapshot_df, snapshot_df)
+            kind, text = ("delta", f"Values added or changed since the data you were given earlier:\n{delta}") if delta else ("none", None)
+        else:
+            kind, text = "none", None
+        self.data_key = data_key
+        self.snapshot_df = snapshot_df
+        return text, kind
+
+
+def history_tokens(history):
+    return sum(estimate_tokens(part.text) for content in history for part in content.parts)
+
+
+def trim_history(history, budget, keep_turns=KEEP_TURNS):
+    """
+    Keeps the last keep_turns messages and folds older ones into a short summary message when the
+    history is over budget. Returns (new_history, trimmed_count); new_history is None if nothing changed.
+    """
+    if history_tokens(history) <= budget or len(history) <= keep_turns:
+        return None, 0
+
+    # The kept tail must start with a user turn: it follows the summary pair (user, model), and the
+    # history itself may start with a model turn (the seeded greeting), so parity alone is not enough.
+    cut = len(history) - keep_turns
+    while cut < len(history) and history[cut].role != "user":
+        cut += 1
+    older, recent = history[:cut], history[cut:]
+    summary_lines = []
+    for content in older:
+        text = " ".join(part.text for part in content.parts)
+        # Data blocks are re-sent after trimming, so only the conversational part is summarized.
+        if "USER PROMPT:" in text:
+            text = text.split("USER PROMPT:", 1)[1]
+        text = " ".join(text.split())[:SUMMARY_CHARS_PER_TURN]
+        summary_lines.append(f"{content.role}: {text}")
+
+    summary = "Summary of the earlier conversation:\n" + "\n".join(summary_lines)
+    new_history = [
+        {"role": "user", "parts": [summary]},
+        {"role": "model", "parts": ['{"message": "Noted."}']},
+    ] + [{"role": content.role, "parts": [part.text for part in content.parts]} for content in recent]
+    return new_history, len(older)
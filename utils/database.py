@@ -1,121 +1,394 @@
+import atexit
+import json
+import logging
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import refresh_derived_metrics
+from utils.migrations import migrate
+from utils.tracing import count, traced
+
+logger = logging.getLogger(__name__)
+
+# One SQLite file per group lives here.
+DATA_DIR = os.getenv("FINANCIA_DATA_DIR", "data")
+
+FINANCIALS_COLUMNS = ['company_id', 'year', 'metric', 'value']
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+}
+
+
+class ConnectionPool:
+    """A small pool of reusable SQLite connections for one database file."""
+
+    def __init__(self, db_path, max_idle=8, timeout=5.0, pragmas=None):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self._lock = threading.Lock()
+        self._open = 0
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        with self._lock:
+            self._open += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._open -= 1
+
+    def acquire(self):
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.db_path} is closed.")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            self._discard(conn)
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """Checks a connection out of the pool, rolling back on error and returning it afterwards."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def health_check(self):
+        """Returns True if a pooled connection can run a trivial query."""
+        try:
+            with self.connection() as conn:
+                return conn.execute("SELECT 1").fetchone()[0] == 1
+        except (sqlite3.Error, RuntimeError):
+            return False
+
+    def stats(self):
+        return {"db_path": self.db_path, "open": self._open, "idle": self._idle.qsize(), "closed": self._closed}
+
+    def close(self):
+        """Closes every idle connection; connections still checked out are closed on release."""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, **kwargs):
+    """Returns the process-wide pool for a database file, creating it on first use."""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None or pool._closed:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None or pool._closed:
+                pool = ConnectionPool(db_path, **kwargs)
+                _pools[key] = pool
+    return pool
+
+
+def close_all_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+atexit.register(close_all_pools)
+
+_bootstrapped = set()
+_bootstrap_lock = threading.Lock()
+
+# data_versions row that tracks the companies table rather than one company.
+COMPANIES_VERSION_ID = 0
+
+
+def bump_data_versions(conn, company_ids):
+    """
+    Increments the persisted data version of each company (None for the companies table).
+    Call it inside the write transaction, so the new version commits together with the data.
+    """
+    conn.executemany(
+        "INSERT INTO data_versions (company_id, version) VALUES (?, 1) "
+        "ON CONFLICT(company_id) DO UPDATE SET version = version + 1",
+        [(COMPANIES_VERSION_ID if company_id is None else int(company_id),) for company_id in set(company_ids)]
+    )
+
+
+def clean_metric_values(values):
+    """Normalizes raw metric values ("1,234", "(56.7)") to floats in one vectorized pass; invalid values become NaN."""
+    text = pd.Series(list(values), dtype=object).astype(str)
+    text = text.str.replace(',', '', regex=False).str.replace('(', '-', regex=False).str.replace(')', '', regex=False).str.strip()
+    return pd.to_numeric(text, errors='coerce').to_numpy(dtype=float)
+
 
 class Database:
-    def __init__(self,group_name):
+    def __init__(self,group_name, db_path=None):
+        """One group's database; db_path defaults to <DATA_DIR>/<group_name>.db (see utils/shards.py for discovery)."""
         self.group_name = group_name 
-        self.DB_PATH = f"data/{group_name}.db"
+        self.DB_PATH = db_path or os.path.join(DATA_DIR, f"{group_name}.db")
+        self.pool = get_pool(self.DB_PATH)
 
     def get_db_connection(self):
-        """Establishes a connection to the SQLite database."""
-        conn = sqlite3.connect(self.DB_PATH, check_same_thread=False) 
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Returns a pooled connection to the SQLite database; use it as a context manager."""
+        return self.pool.connection()
+
+    def health_check(self):
+        return self.pool.health_check()
 
+    def data_version(self, company_id=None):
+        """
+        A counter that changes whenever any process writes data for the company (or the companies
+        table if None). It is stored in the database, so caches keyed on it see other writers too.
+        """
+        return self.data_versions([company_id])[0]
+
+    def data_versions(self, company_ids):
+        """data_version of many companies in one query, in the order given."""
+        ids = [COMPANIES_VERSION_ID if company_id is None else int(company_id) for company_id in company_ids]
+        try:
+            with self.get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                versions = dict(cursor.execute(
+                    "SELECT company_id, version FROM data_versions WHERE company_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(ids),)
+                ).fetchall())
+        except sqlite3.OperationalError:
+            # Not migrated yet (no data_versions table): nothing has been versioned.
+            versions = {}
+        return [versions.get(company_id, 0) for company_id in ids]
+
+    @traced("db.setup_database")
     def setup_database(self): 
-        """Creates the necessary tables if they don't exist and populates initial data."""
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT)")
-        cursor.execute("CREATE TABLE IF NOT EXISTS companies (id INTEGER PRIMARY KEY, name TEXT UNIQUE, group_name TEXT)")
-        cursor.execute("CREATE TABLE IF NOT EXISTS user_company_access (user_id INTEGER, company_id INTEGER, PRIMARY KEY (user_id, company_id))")
-        cursor.execute("CREATE TABLE IF NOT EXISTS financial_data (id INTEGER PRIMARY KEY, company_id INTEGER, year INTEGER, metric TEXT, value REAL, source_document TEXT, UNIQUE(company_id, year, metric))")
-
-        if self.group_name == 'reliance' and cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
-            cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", ('reliance_analyst', 'reliance123', 'analyst'))
-            cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", ('jio_ceo', 'jio12345', 'ceo'))
-            cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", ('reliance_owner', 'reliance123', 'top_management'))
-
-        if self.group_name == 'tata' and cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
-            cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", ('tata_analyst', 'tata1234', 'analyst'))
-            cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", ('tata_steel_ceo', 'steel1234', 'ceo'))
-            cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", ('tata_owner', 'tata1234', 'top_management'))
-
-        if self.group_name == 'reliance' and cursor.execute("SELECT COUNT(*) FROM companies").fetchone()[0] == 0:
-            cursor.execute("INSERT INTO companies (name, group_name) VALUES (?, ?)", ('Reliance Jio', 'Reliance'))
-            cursor.execute("INSERT INTO companies (name, group_name) VALUES (?, ?)", ('Reliance Trends', 'Reliance'))
-            cursor.execute("INSERT INTO companies (name, group_name) VALUES (?, ?)", ('Reliance Industries', 'Reliance')) 
-
-        if self.group_name == 'tata' and cursor.execute("SELECT COUNT(*) FROM companies").fetchone()[0] == 0:
-            cursor.execute("INSERT INTO companies (name, group_name) VALUES (?, ?)", ('Tata Steel', 'TATA'))
-            cursor.execute("INSERT INTO companies (name, group_name) VALUES (?, ?)", ('Tata Motors', 'TATA'))
-            cursor.execute("INSERT INTO companies (name, group_name) VALUES (?, ?)", ('Tata Salt', 'TATA')) 
-
-        if self.group_name == "reliance" and cursor.execute("SELECT COUNT(*) FROM user_company_access").fetchone()[0] == 0:
-            cursor.execute("INSERT INTO user_company_access (user_id, company_id) VALUES ((SELECT id FROM users WHERE username='jio_ceo'), (SELECT id FROM companies WHERE name='Reliance Jio'))")
-        
-        if self.group_name == "tata" and cursor.execute("SELECT COUNT(*) FROM user_company_access").fetchone()[0] == 0:
-            cursor.execute("INSERT INTO user_company_access (user_id, company_id) VALUES ((SELECT id FROM users WHERE username='tata_steel_ceo'), (SELECT id FROM companies WHERE name='Tata Steel'))")
-
-        conn.commit()
-        conn.close()
+        """Brings the schema and seed data up to date, at most once per process for each database file."""
+        key = os.path.abspath(self.DB_PATH)
+        if key in _bootstrapped:
+            return
+        with _bootstrap_lock:
+            if key in _bootstrapped:
+                return
+            with self.get_db_connection() as conn:
+                if migrate(conn, self.group_name):
+                    with conn:
+                        bump_data_versions(conn, [None])
+            _bootstrapped.add(key)
 
+    @traced("db.get_user")
     def get_user(self,username):
-        conn = self.get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
+        with self.get_db_connection() as conn:
+            user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
         return user
 
+    @traced("db.get_user_accessible_companies")
     def get_user_accessible_companies(self,user_id, role):
-        conn = self.get_db_connection()
-        if role == 'top_management' or role == 'analyst':
-            companies = conn.execute('SELECT * FROM companies ORDER BY name').fetchall()
-        elif role == 'ceo':
-            companies = conn.execute('SELECT c.* FROM companies c JOIN user_company_access uca ON c.id = uca.company_id WHERE uca.user_id = ?', (user_id,)).fetchall()
-        else:
-            companies = []
-        conn.close()
+        with self.get_db_connection() as conn:
+            if role == 'top_management' or role == 'analyst':
+                companies = conn.execute('SELECT * FROM companies ORDER BY name').fetchall()
+            elif role == 'ceo':
+                companies = conn.execute('SELECT c.* FROM companies c JOIN user_company_access uca ON c.id = uca.company_id WHERE uca.user_id = ?', (user_id,)).fetchall()
+            else:
+                companies = []
         return companies
 
+    @traced("db.get_all_companies")
     def get_all_companies(self):
-        conn = self.get_db_connection()
-        companies = conn.execute('SELECT * FROM companies ORDER BY name').fetchall()
-        conn.close()
+        with self.get_db_connection() as conn:
+            companies = conn.execute('SELECT * FROM companies ORDER BY name').fetchall()
         return companies
 
     def save_financial_data(self, company_id, year, metrics, source_document):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        print(f"[DEBUG] Connected to DB: {self.DB_PATH}")
-        print(f"[DEBUG] Saving data for company_id={company_id}, year={year}, source={source_document}")
-    
-        inserted_count = 0
-        for metric, value in metrics.items():
-            try:
-                cleaned_value = float(str(value).replace(',', '').replace('(', '-').replace(')', ''))
-            except (ValueError, TypeError):
-                print(f"[SKIP] Metric: {metric} has invalid value: {value}")
-                continue
-            
-            try:
+        """Saves one report's metrics; see save_financial_records for the returned report."""
+        return self.save_financial_records([(company_id, year, metrics)], source_document=source_document)
+
+    @traced("db.save_financial_records")
+    def save_financial_records(self, records, source_document=None, batch_size=200):
+        """
+        Bulk-saves (company_id, year, metrics[, source_document]) records.
+        Each batch of records is written in a single transaction with executemany.
+        Returns a report with inserted/skipped/failed counts and the skipped metrics.
+        """
+        report = {"records": 0, "batches": 0, "inserted": 0, "skipped": 0, "failed": 0, "derived": 0, "skipped_metrics": [], "errors": []}
+        records = list(records)
+
+        with self.get_db_connection() as conn:
+            for start in range(0, len(records), batch_size):
+                batch = records[start:start + batch_size]
+                company_ids, years, names, raw_values, sources = [], [], [], [], []
+                for record in batch:
+                    company_id, year, metrics = record[:3]
+                    source = record[3] if len(record) > 3 else source_document
+                    for metric, value in metrics.items():
+                        company_ids.append(company_id)
+                        years.append(year)
+                        names.append(metric)
+                        raw_values.append(value)
+                        sources.append(source)
+
+                values = clean_metric_values(raw_values)
+                valid = ~np.isnan(values)
+                rows = [
+                    (company_ids[i], years[i], names[i], float(values[i]), sources[i])
+                    for i in np.flatnonzero(valid)
+                ]
+                for i in np.flatnonzero(~valid):
+                    logger.debug("Skipping metric %r for company_id=%s, year=%s: invalid value %r", names[i], company_ids[i], years[i], raw_values[i])
+                    report["skipped_metrics"].append((company_ids[i], years[i], names[i]))
+
+                report["records"] += len(batch)
+                report["batches"] += 1
+                report["skipped"] += int((~valid).sum())
+                try:
+                    with conn:
+                        conn.executemany(
+                            '''INSERT OR REPLACE INTO financial_data 
+                               (company_id, year, metric, value, source_document) 
+                               VALUES (?, ?, ?, ?, ?)''',
+                            rows
+                        )
+                        # Ratios and growth of the touched companies are refreshed in the same transaction.
+                        report["derived"] += refresh_derived_metrics(conn, {row[0] for row in rows}) if rows else 0
+                        bump_data_versions(conn, {row[0] for row in rows})
+                    report["inserted"] += len(rows)
+                except sqlite3.Error as e:
+                    logger.error("Failed to save a batch of %d metrics to %s: %s", len(rows), self.DB_PATH, e)
+                    report["failed"] += len(rows)
+                    report["errors"].append(str(e))
+
+        count("db.rows_written", report["inserted"])
+        count("db.derived_rows_written", report["derived"])
+        logger.info(
+            "Saved %d metrics from %d records to %s (%d skipped, %d failed)",
+            report["inserted"], report["records"], self.DB_PATH, report["skipped"], report["failed"]
+        )
+        return report
+
+    @traced("db.get_company_financials")
+    def get_company_financials(self,company_id):
+        with self.get_db_connection() as conn:
+            data = conn.execute('SELECT year, metric, value FROM financial_data WHERE company_id = ? ORDER BY year, metric', (company_id,)).fetchall()
+        return data
+
+    @traced("db.get_financials_frame")
+    def get_financials_frame(self, company_ids):
+        """
+        Fetches financial data for many companies in one query as a long DataFrame
+        (company_id, year, metric, value), without building sqlite3.Row objects.
+        """
+        company_ids = [int(c) for c in company_ids]
+        with self.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(
+                'SELECT company_id, year, metric, value FROM financial_data '
+                'WHERE company_id IN (SELECT value FROM json_each(?)) ORDER BY company_id, year, metric',
+                (json.dumps(company_ids),)
+            )
+            rows = cursor.fetchall()
+        count("db.rows_read", len(rows))
+        return pd.DataFrame.from_records(rows, columns=FINANCIALS_COLUMNS)
+
+    def get_financials_snapshots(self, company_ids):
+        """Returns a (company_id, metric) x year frame for many companies."""
+        frame = self.get_financials_frame(company_ids)
+        return frame.pivot(index=['company_id', 'metric'], columns='year', values='value').sort_index()
+
+    def get_financials_snapshot(self, company_id):
+        """Returns the metric x year snapshot of one company, empty if it has no data."""
+        frame = self.get_financials_frame([company_id])
+        return frame.pivot(index='metric', columns='year', values='value').sort_index()
+
+    @traced("db.get_group_frame")
+    def get_group_frame(self, company_ids):
+        """
+        Raw and derived metrics of many companies in one query, as a long DataFrame
+        (company_id, year, metric, value). Feeds utils.analytics.FinancialCube.
+        """
+        ids = json.dumps([int(c) for c in company_ids])
+        with self.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(
+                'SELECT company_id, year, metric, value FROM financial_data WHERE company_id IN (SELECT value FROM json_each(?)) '
+                'UNION ALL '
+                'SELECT company_id, year, metric, value FROM derived_metrics WHERE company_id IN (SELECT value FROM json_each(?))',
+                (ids, ids)
+            )
+            rows = cursor.fetchall()
+        count("db.rows_read", len(rows))
+        return pd.DataFrame.from_records(rows, columns=FINANCIALS_COLUMNS)
+
+    @traced("db.get_derived_frame")
+    def get_derived_frame(self, company_ids=None):
+        """Precomputed ratios and growth (see utils/analytics.py) as a long DataFrame, for all companies when None."""
+        with self.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            if company_ids is None:
+                cursor.execute('SELECT company_id, year, metric, value FROM derived_metrics ORDER BY company_id, year, metric')
+            else:
                 cursor.execute(
-                    '''INSERT OR REPLACE INTO financial_data 
-                       (company_id, year, metric, value, source_document) 
-                       VALUES (?, ?, ?, ?, ?)''',
-                    (company_id, year, metric, cleaned_value, source_document)
+                    'SELECT company_id, year, metric, value FROM derived_metrics '
+                    'WHERE company_id IN (SELECT value FROM json_each(?)) ORDER BY company_id, year, metric',
+                    (json.dumps([int(c) for c in company_ids]),)
                 )
-                inserted_count += 1
-                print(f"[OK] Inserted: {metric} = {cleaned_value}")
-            except Exception as e:
-                print(f"[ERROR] Failed to insert {metric}: {e}")
-    
-        conn.commit()
-    
-        try:
-            cursor.execute('SELECT * FROM financial_data WHERE company_id = ? AND year = ?', (company_id, year))
             rows = cursor.fetchall()
-            print(f"[DEBUG] {len(rows)} rows now exist for company_id={company_id}, year={year}")
-            for row in rows:
-                print(row)
-        except Exception as e:
-            print(f"[ERROR] Failed to fetch saved data: {e}")
-    
-        conn.close()
-        print(f"[DONE] Saved {inserted_count} metrics.\n")
-    
+        return pd.DataFrame.from_records(rows, columns=FINANCIALS_COLUMNS)
+
+    def get_derived_snapshot(self, company_id):
+        """Returns the derived metric x year table of one company, empty if it has no data."""
+        frame = self.get_derived_frame([company_id])
+        return frame.pivot(index='metric', columns='year', values='value').sort_index()
+
+    @traced("db.refresh_derived_metrics")
+    def refresh_derived_metrics(self, company_ids=None):
+        """Rebuilds derived_metrics from financial_data, for every company when company_ids is None."""
+        with self.get_db_connection() as conn:
+            with conn:
+                count = refresh_derived_metrics(conn, company_ids)
+                if company_ids is None:
+                    company_ids = [row[0] for row in conn.execute("SELECT id FROM companies")]
+                bump_data_versions(conn, company_ids)
+        return count
 
-    def get_company_financials(self,company_id):
-        conn = self.get_db_connection()
-        data = conn.execute('SELECT year, metric, value FROM financial_data WHERE company_id = ? ORDER BY year, metric', (company_id,)).fetchall()
-        conn.close()
-        return data 
\ No newline at end of file
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+
+CACHE_DIR = os.getenv("FINANCIA_CACHE_DIR", os.path.join(".cache", "extraction"))
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# The running size is re-measured from disk every this many writes, to pick up other processes' writes.
+RESCAN_WRITES = 100
+# Eviction frees space down to this fraction of max_bytes, so a full cache is not walked on every write.
+EVICT_TO = 0.9
+
+
+def content_hash(data):
+    """SHA-256 of a document's bytes (or text), used as its cache address."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionCache:
+    """
+    On-disk, content-addressed cache for parsed page text and LLM extraction results.
+    Entries are JSON files; the least recently used ones are evicted once the cache exceeds max_bytes.
+    The entry count and size are kept as running totals, so writes and stats() do not walk the tree.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entry_count = None
+        self._bytes = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, kind, key):
+        return os.path.join(self.root, kind, key[:2], f"{key}.json")
+
+    def _read(self, kind, key):
+        path = self._path(kind, key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # Mark as recently used for eviction.
+        except OSError:
+            pass  # Evicted by another process since the read; the value is still good.
+        self.hits += 1
+        return value
+
+    def _write(self, kind, key, value):
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = None
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += size - (old_size or 0)
+                self._entry_count += old_size is None
+            self._writes += 1
+            self._refresh()
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".json"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def _refresh(self):
+        """Measures the cache on first use and every RESCAN_WRITES writes; call with the lock held."""
+        if self._bytes is None or self._writes >= RESCAN_WRITES:
+            entries = list(self._entries())
+            self._entry_count = len(entries)
+            self._bytes = sum(size for _, size, _ in entries)
+            self._writes = 0
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache is below EVICT_TO of max_bytes; call with the lock held."""
+        entries = list(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in sorted(entries, key=lambda e: e[2]):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        self._entry_count = len(entries) - removed
+        self._bytes = total
+
+    def get_pages(self, doc_hash):
+        return self._read("pages", doc_hash)
+
+    def put_pages(self, doc_hash, pages):
+        self._write("pages", doc_hash, pages)
+
+    @staticmethod
+    def extraction_key(doc_hash, year, keys_version, model_name):
+        return content_hash(json.dumps([doc_hash, int(year), keys_version, model_name]))
+
+    def get_extraction(self, doc_hash, year, keys_version, model_name):
+        return self._read("extractions", self.extraction_key(doc_hash, year, keys_version, model_name))
+
+    def put_extraction(self, doc_hash, year, keys_version, model_name, data):
+        self._write("extractions", self.extraction_key(doc_hash, year, keys_version, model_name), data)
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                "entries": self._entry_count,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                os.remove(path)
+            self._entry_count = 0
+            self._bytes = 0
+
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,406 @@
+import csv
+import io
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+import requests
+
+from utils.database import Database
+from utils.extraction_cache import content_hash, extraction_cache
+from utils.parser import parse_pdf, PDF_WORKERS
+from utils.tracing import span
+from utils.web import ResponseTooLarge, fetch_financial_tables
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "files"
+JOB_WORKERS = 4
+# Upper bound on concurrent LLM extraction calls across all workers in the process.
+MAX_INFLIGHT_EXTRACTIONS = 2
+POLL_INTERVAL = 1.0
+RETRY_BASE_DELAY = 5.0
+# A running job whose owner cannot be checked (another host, or no owner) is taken over after this long without progress.
+LEASE_TIMEOUT = 60 * 60
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Job lifecycle: queued -> running -> done | failed, with running -> retrying -> running on retryable errors.
+
+
+class JobError(Exception):
+    """A pipeline failure; retryable errors are attempted again with backoff."""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+_extraction_slots = threading.BoundedSemaphore(MAX_INFLIGHT_EXTRACTIONS)
+
+_INSERT_JOB = (
+    "INSERT INTO jobs (company_id, year, source_type, source, source_name, status, stage, progress, "
+    "max_attempts, next_attempt_at, created_by, created_at, updated_at, batch_id) "
+    "VALUES (?, ?, ?, ?, ?, 'queued', 'queued', 0, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def enqueue_job(db, company_id, year, source_type, source, source_name, created_by=None, max_attempts=3):
+    """Adds a parse -> extract -> save job for a stored PDF path or a URL and returns its id."""
+    now = time.time()
+    with db.get_db_connection() as conn:
+        with conn:
+            cursor = conn.execute(
+                _INSERT_JOB,
+                (company_id, year, source_type, source, source_name, max_attempts, now, created_by, now, now, None)
+            )
+    return cursor.lastrowid
+
+
+def enqueue_batch(db, items, created_by=None, max_attempts=3):
+    """
+    Queues many jobs in one transaction. Each item is a dict with company_id, year,
+    source_type ("pdf" or "url"), source and source_name. Returns the new batch id.
+    """
+    batch_id = uuid.uuid4().hex[:12]
+    now = time.time()
+    rows = [
+        (item["company_id"], item["year"], item["source_type"], item["source"], item["source_name"],
+         max_attempts, now, created_by, now, now, batch_id)
+        for item in items
+    ]
+    with db.get_db_connection() as conn:
+        with conn:
+            conn.executemany(_INSERT_JOB, rows)
+    return batch_id
+
+
+def parse_manifest(text, company_ids):
+    """
+    Reads a CSV manifest with company, year and source columns. company_ids maps company names to ids.
+    Returns (items, errors); sources starting with http(s) become URL jobs, anything else names an uploaded PDF.
+    """
+    items, errors = [], []
+    reader = csv.DictReader(io.StringIO(text))
+    for line_number, row in enumerate(reader, start=2):
+        # Fields beyond the header (e.g. a trailing comma) are collected under the None key as a list.
+        extra = [v for v in row.pop(None, None) or [] if v and v.strip()]
+        if extra:
+            errors.append(f"line {line_number}: unexpected extra fields {extra}")
+            continue
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        company, year, source = row.get("company", ""), row.get("year", ""), row.get("source", "")
+        if company not in company_ids:
+            errors.append(f"line {line_number}: unknown company '{company}'")
+            continue
+        try:
+            year = int(float(year))
+        except ValueError:
+            errors.append(f"line {line_number}: invalid year '{year}'")
+            continue
+        if not source:
+            errors.append(f"line {line_number}: missing source")
+            continue
+        is_url = source.lower().startswith(("http://", "https://"))
+        items.append({
+            "company_id": company_ids[company],
+            "year": year,
+            "source_type": "url" if is_url else "pdf",
+            "source": source,
+            "source_name": f"web source of {company}" if is_url else source,
+        })
+    return items, errors
+
+
+def batch_summary(db, batch_id):
+    """Per-item results plus aggregate status counts and throughput for a batch."""
+    with db.get_db_connection() as conn:
+        jobs = conn.execute("SELECT * FROM jobs WHERE batch_id = ? ORDER BY id", (batch_id,)).fetchall()
+    counts = {}
+    for job in jobs:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    finished = [job for job in jobs if job["finished_at"]]
+    started = [job["started_at"] for job in jobs if job["started_at"]]
+    elapsed = max(job["finished_at"] for job in finished) - min(started) if finished and started else 0.0
+    return {
+        "batch_id": batch_id,
+        "total": len(jobs),
+        "counts": counts,
+        "finished": len(finished),
+        "elapsed": elapsed,
+        "docs_per_minute": 60 * len(finished) / elapsed if elapsed else 0.0,
+        "jobs": jobs,
+    }
+
+
+def store_upload(data):
+    """Saves uploaded PDF bytes under a content-addressed name so the job can read them later."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, f"{content_hash(data)}.pdf")
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+
+def list_jobs(db, limit=50, created_by=None):
+    with db.get_db_connection() as conn:
+        if created_by is None:
+            return conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return conn.execute("SELECT * FROM jobs WHERE created_by = ? ORDER BY id DESC LIMIT ?", (created_by, limit)).fetchall()
+
+
+def get_job(db, job_id):
+    with db.get_db_connection() as conn:
+        return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def update_job(db, job_id, **fields):
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with db.get_db_connection() as conn:
+        with conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def claim_next_job(db):
+    """Atomically marks the oldest due job as running and returns it, or None."""
+    now = time.time()
+    with db.get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'retrying') AND next_attempt_at <= ? ORDER BY id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if job is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = COALESCE(started_at, ?), "
+                    "updated_at = ?, owner = ? WHERE id = ?",
+                    (now, now, WORKER_ID, job["id"])
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return job
+
+
+def _owner_alive(owner):
+    """True or False for a worker process on this host, None if it cannot be checked from here."""
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def requeue_abandoned_jobs(db, lease_timeout=LEASE_TIMEOUT):
+    """
+    Queues running jobs again whose worker is gone: its process on this host has exited, or (when that
+    cannot be checked) the job made no progress for lease_timeout seconds. Returns the requeued ids.
+    """
+    now = time.time()
+    with db.get_db_connection() as conn:
+        running = conn.execute("SELECT id, owner, updated_at FROM jobs WHERE status = 'running'").fetchall()
+        abandoned = []
+        for job in running:
+            alive = _owner_alive(job["owner"])
+            if alive is False or (alive is None and (job["updated_at"] or 0) < now - lease_timeout):
+                abandoned.append(job["id"])
+        if abandoned:
+            with conn:
+                conn.executemany(
+                    "UPDATE jobs SET status = 'queued', next_attempt_at = 0, owner = NULL WHERE id = ? AND status = 'running'",
+                    [(job_id,) for job_id in abandoned]
+                )
+    if abandoned:
+        logger.warning("Requeued %d jobs abandoned by dead workers: %s", len(abandoned), abandoned)
+    return abandoned
+
+
+def _parse_stage(job):
+    if job["source_type"] == "pdf":
+        with open(job["source"], "rb") as f:
+            doc_hash = content_hash(f.read())
+        pages = extraction_cache.get_pages(doc_hash)
+        if pages is None:
+            pages = parse_pdf(job["source"], workers=PDF_WORKERS, keep_empty=True)
+            if not pages:
+                raise JobError("Failed to extract any text from the PDF. The document might be scanned, encrypted or corrupted.")
+            extraction_cache.put_pages(doc_hash, pages)
+    else:
+        from utils.llm import REQUIRED_KEYS
+
+        try:
+            page = fetch_financial_tables(job["source"], REQUIRED_KEYS)
+        except ResponseTooLarge as e:
+            raise JobError(str(e))
+        except requests.exceptions.RequestException as e:
+            raise JobError(f"fetch error: {e}", retryable=True)
+        doc_hash = page["content_hash"]
+        pages = [page["text"]]
+        logger.info("Fetched %s: %d bytes, kept %d of %d tables", job["source"], page["bytes"], page["tables_kept"], page["tables_seen"])
+    return doc_hash, pages
+
+
+def _extract_stage(model, job, doc_hash, pages):
+    """Returns (financial_data, locator_stats); locator_stats is None for cached results and URL jobs."""
+    # utils.llm is imported lazily to keep the job queue importable without the LLM stack.
+    from utils.llm import MODEL_NAME, REQUIRED_KEYS, REQUIRED_KEYS_VERSION
+
+    year = job["year"]
+    financial_data = extraction_cache.get_extraction(doc_hash, year, REQUIRED_KEYS_VERSION, MODEL_NAME)
+    if financial_data is not None:
+        return financial_data, None
+
+    # The model is reused across jobs, so stats from the previous job must not leak into this one.
+    model.last_locator_stats = None
+    with _extraction_slots:
+        if job["source_type"] == "pdf":
+            financial_data = model.extract_financials(job["source"], pages, year)
+        else:
+            financial_data = model.structure_data_with_gemini(pages[0], year)
+    if "error" in financial_data:
+        partial = financial_data.get("partial")
+        if partial and job["attempts"] + 1 >= job["max_attempts"]:
+            # Out of retries: keep what the table extractor found rather than nothing. Not cached, so a rerun asks again.
+            logger.warning("Job %s: AI analysis failed (%s); saving %d metrics read from tables", job["id"], financial_data["error"], len(partial))
+            return {key: partial.get(key) for key in REQUIRED_KEYS}, model.last_locator_stats
+        raise JobError(f"AI Analysis Failed: {financial_data['error']}", retryable=True)
+
+    extraction_cache.put_extraction(doc_hash, year, REQUIRED_KEYS_VERSION, MODEL_NAME, financial_data)
+    return financial_data, model.last_locator_stats
+
+
+def run_job(db, model, job):
+    """
+    Runs the parse -> extract -> save pipeline for a claimed job, recording progress as it goes.
+    Returns (save report, locator stats). A save that fails in the database raises a retryable JobError.
+    """
+    with span("job", job_id=job["id"], source_type=job["source_type"], attempt=job["attempts"] + 1):
+        update_job(db, job["id"], stage="parse", progress=0.1, message="Extracting text")
+        with span("job.parse") as stage:
+            doc_hash, pages = _parse_stage(job)
+            stage.set(pages=len(pages))
+
+        update_job(db, job["id"], stage="extract", progress=0.4, message=f"Analyzing {len(pages)} pages with AI")
+        with span("job.extract"):
+            financial_data, locator_stats = _extract_stage(model, job, doc_hash, pages)
+
+        update_job(db, job["id"], stage="save", progress=0.9, message="Saving extracted data")
+        with span("job.save"):
+            report = db.save_financial_data(job["company_id"], job["year"], metrics=financial_data, source_document=job["source_name"])
+        if report["failed"]:
+            raise JobError(f"Failed to save {report['failed']} metrics: {'; '.join(report['errors'])}", retryable=True)
+    return report, locator_stats
+
+
+def _done_message(report, locator_stats=None):
+    """The status line of a finished job, including how much of the report was sent to the AI."""
+    message = f"Saved {report['inserted']} metrics ({report['skipped']} skipped)"
+    if locator_stats:
+        message += (
+            f". Sent {locator_stats['pages_out']} of {locator_stats['pages_in']} pages to the AI "
+            f"({locator_stats['reduction']:.0%} smaller prompt)"
+        )
+    return message
+
+
+class JobWorkerPool:
+    """Background threads that drain one group's job queue."""
+
+    def __init__(self, group_name, workers=JOB_WORKERS, poll_interval=POLL_INTERVAL):
+        self.group_name = group_name
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        db = Database(self.group_name)
+        db.setup_database()
+        # Jobs left running by a process that has died will never finish; queue them again.
+        requeue_abandoned_jobs(db)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"jobs-{self.group_name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        from utils.llm import GeminiModel
+
+        db = Database(self.group_name)
+        model = None
+        while not self._stop.is_set():
+            try:
+                job = claim_next_job(db)
+            except Exception:
+                logger.exception("Failed to claim a job for %s", self.group_name)
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            try:
+                if model is None:
+                    model = GeminiModel()
+                report, locator_stats = run_job(db, model, job)
+            except Exception as e:
+                retryable = isinstance(e, JobError) and e.retryable
+                if retryable and job["attempts"] + 1 < job["max_attempts"]:
+                    delay = RETRY_BASE_DELAY * 2 ** job["attempts"] * (1 + random.random())
+                    logger.warning("Job %s failed (%s); retrying in %.0fs", job["id"], e, delay)
+                    update_job(db, job["id"], status="retrying", next_attempt_at=time.time() + delay, message=f"{e} (retrying)")
+                else:
+                    logger.error("Job %s failed: %s", job["id"], e)
+                    update_job(db, job["id"], status="failed", message=str(e), finished_at=time.time())
+                    self._cleanup(db, job)
+                continue
+
+            update_job(
+                db, job["id"], status="done", stage="done", progress=1.0, finished_at=time.time(),
+                message=_done_message(report, locator_stats)
+            )
+            self._cleanup(db, job)
+
+    @staticmethod
+    def _cleanup(db, job):
+        """Removes a stored upload once no other pending job needs it."""
+        if job["source_type"] != "pdf" or not os.path.exists(job["source"]):
+            return
+        with db.get_db_connection() as conn:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE source = ? AND id != ? AND status IN ('queued', 'running', 'retrying')",
+                (job["source"], job["id"])
+            ).fetchone()[0]
+        if not pending:
+            os.remove(job["source"])
+
+
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+def get_worker_pool(group_name, workers=JOB_WORKERS):
+    """Returns the process-wide worker pool for a group, starting it on first use."""
+    with _worker_pools_lock:
+        pool = _worker_pools.get(group_name)
+        if pool is None:
+            pool = JobWorkerPool(group_name, workers=workers)
+            pool.start()
+            _worker_pools[group_name] = pool
+        return pool
@@ -0,0 +1,117 @@
+import json
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+# Parser states.
+_SEEK, _AFTER_COLON, _VALUE, _DONE = range(4)
+
+
+class StringFieldParser:
+    """
+    Incrementally decodes one top-level string field of a JSON object that arrives in chunks,
+    so its text can be shown before the rest of the object (e.g. "plot_request") is complete.
+    """
+
+    def __init__(self, field="message"):
+        self.field = field
+        self.text = ""
+        self.raw = ""
+        self._state = _SEEK
+        self._depth = 0
+        self._in_string = False
+        self._escape = None  # pending escape sequence inside a string, e.g. "u00"
+        self._high_surrogate = None
+        self._key = []
+        self._after_key = False
+        self._is_field = False
+
+    @property
+    def done(self):
+        return self._state == _DONE
+
+    def feed(self, chunk):
+        """Consumes the next chunk of raw JSON and returns the newly decoded part of the field."""
+        self.raw += chunk
+        out = []
+        for char in chunk:
+            if self._state == _DONE:
+                break
+            if self._state == _VALUE:
+                self._value_char(char, out)
+            elif self._state == _AFTER_COLON:
+                if not char.isspace():
+                    self._state = _VALUE if char == '"' else _DONE
+            else:
+                self._seek_char(char)
+        text = "".join(out)
+        self.text += text
+        return text
+
+    def _seek_char(self, char):
+        if self._in_string:
+            if self._escape is not None:
+                self._escape = None
+            elif char == "\\":
+                self._escape = ""
+            elif char == '"':
+                self._in_string = False
+                self._after_key = self._depth == 1
+                self._is_field = self._after_key and "".join(self._key) == self.field
+            elif self._depth == 1:
+                self._key.append(char)
+            return
+
+        if char.isspace():
+            return
+        if self._after_key and char == ":" and self._is_field:
+            self._state = _AFTER_COLON
+            return
+        self._after_key = False
+        if char == '"':
+            self._in_string = True
+            self._key = []
+        elif char in "{[":
+            self._depth += 1
+        elif char in "}]":
+            self._depth -= 1
+
+    def _value_char(self, char, out):
+        if self._escape is None:
+            if char == "\\":
+                self._escape = ""
+            elif char == '"':
+                self._state = _DONE
+            else:
+                out.append(char)
+            return
+
+        self._escape += char
+        if self._escape[0] == "u":
+            if len(self._escape) == 5:
+                code = int(self._escape[1:], 16)
+                self._escape = None
+                if 0xD800 <= code < 0xDC00:
+                    self._high_surrogate = code
+                    return
+                if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                    code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+                self._high_surrogate = None
+                out.append(chr(code))
+        else:
+            out.append(_ESCAPES.get(self._escape, self._escape))
+            self._escape = None
+
+    def result(self):
+        """
+        Parses the complete raw text, falling back to just the decoded field if it is not valid JSON.
+        Always returns a dict: a reply that is valid JSON but not an object comes back as the field's
+        text (the reply itself if it is a string) with an "error".
+        """
+        try:
+            value = json.loads(self.raw)
+        except ValueError:
+            return {self.field: self.text}
+        if isinstance(value, dict):
+            return value
+        text = value if isinstance(value, str) else self.raw
+        return {self.field: text, "error": f"expected a JSON object, got {type(value).__name__}"}
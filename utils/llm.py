@@ -1,16 +1,20 @@
+import hashlib
 import json
-import google.generativeai as genai
+import logging
 import os
-import streamlit as st
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from dotenv import load_dotenv
-load_dotenv()
+from utils.chunking import CHUNK_WORKERS, PAGE_SEPARATOR, WINDOW_TOKENS, merge_candidates, page_windows
+from utils.context import ChatContext, TOKEN_BUDGET, estimate_tokens, history_tokens, trim_history
+from utils.jsonstream import StringFieldParser
+from utils.locator import PageLocator
+from utils.resilience import ResilientCaller
+from utils.throttle import CallLimiter
+from utils.tracing import count, span, traced, tracer
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    st.error("GEMINI_API_KEY not found in environment variables. Please set it before running the app.")
-    raise ValueError("GEMINI_API_KEY is required for GeminiModel to function.")
-genai.configure(api_key=API_KEY)
+logger = logging.getLogger(__name__)
 
 REQUIRED_KEYS = [
     "Revenue from Operations", "Other Income", "Total Income", "Profit Before Tax",
@@ -19,13 +23,22 @@ REQUIRED_KEYS = [
     "Current liabilities", "Cash and cash equivalents", "Earnings Per Share (Basic)"
 ]
 
-class GeminiModel:
-    def __init__(self):
-        # Model for data extraction remains stateless
-        self.extraction_model = genai.GenerativeModel("gemini-1.5-flash-latest")
+# Changes whenever REQUIRED_KEYS does, so cached extractions for the old key set are not reused.
+REQUIRED_KEYS_VERSION = hashlib.sha1(json.dumps(REQUIRED_KEYS).encode("utf-8")).hexdigest()[:12]
+
+MODEL_NAME = "gemini-1.5-flash-latest"
+
+# Shared across every session and worker in the process.
+MAX_CONCURRENT_CALLS = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_RPM", "60"))
+
+# Number of candidate pages forwarded to the extractor.
+PAGE_TOP_K = 25
+# Longer text is extracted in windows (see utils/chunking.py) rather than in one prompt.
+SINGLE_SHOT_CHARS = 900_000
+page_locator = PageLocator(REQUIRED_KEYS)
 
-        # Instructions for the main analyst model
-        analyst_instructions = """
+ANALYST_INSTRUCTIONS = """
             You are an expert Financial analyst and a helpful conversational assistant. Your goal is to help a top executive understand their company's performance by analyzing data and chatting with them.
 
             Your Core Directives:
@@ -40,10 +53,92 @@ class GeminiModel:
                 - Match the "metric" name EXACTLY from the data table.
             5.  **Data Context**: Financial data will be provided with prompts that need analysis. Use it to answer, but don't mention the data prompt itself to the user.
             """
-        # We will use this model to create a stateful chat session
-        self.analyst_model = genai.GenerativeModel("gemini-1.5-flash-latest", system_instruction=analyst_instructions)
+
+
+class ModelRegistry:
+    """
+    Process-wide, lazily initialized Gemini client. The SDK is imported and configured on first
+    use, GenerativeModel objects are built once and shared, and every upstream call goes through
+    one CallLimiter so all sessions share the same concurrency cap and rate limit. Extraction calls
+    also go through a ResilientCaller (retries, circuit breaker, request coalescing).
+    model_factory(name, system_instruction) replaces the SDK, e.g. with a local fake for testing.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_CALLS, requests_per_minute=REQUESTS_PER_MINUTE, model_factory=None):
+        self.limiter = CallLimiter(max_concurrent, requests_per_minute)
+        self.caller = ResilientCaller(self.limiter)
+        self.model_factory = model_factory
+        self._genai = None
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def sdk(self):
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+                    from dotenv import load_dotenv
+
+                    load_dotenv()
+                    api_key = os.getenv("GEMINI_API_KEY")
+                    if not api_key:
+                        import streamlit as st
+                        st.error("GEMINI_API_KEY not found in environment variables. Please set it before running the app.")
+                        raise ValueError("GEMINI_API_KEY is required for GeminiModel to function.")
+                    genai.configure(api_key=api_key)
+                    self._genai = genai
+        return self._genai
+
+    def get_model(self, name=MODEL_NAME, system_instruction=None):
+        key = (name, system_instruction)
+        model = self._models.get(key)
+        if model is None:
+            factory = self.model_factory or self.sdk().GenerativeModel
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = factory(name, system_instruction=system_instruction)
+                    self._models[key] = model
+        return model
+
+    def metrics(self):
+        return dict(
+            self.limiter.metrics(), **self.caller.metrics(),
+            models=len(self._models), configured=self._genai is not None
+        )
+
+
+registry = ModelRegistry()
+
+
+class GeminiModel:
+    """
+    Per-user handle on the shared registry. It only holds the chat session and its context,
+    so creating one per Streamlit session or worker is cheap.
+    """
+
+    def __init__(self, registry=registry):
+        self.registry = registry
         self.chat_session = None
+        self.last_locator_stats = None
+        self.last_extraction_sources = None
+        self.last_chunk_stats = None
+        self.context = ChatContext()
+        self.token_budget = TOKEN_BUDGET
+        self.last_prompt_stats = None
+        self.last_response = None
 
+    @property
+    def extraction_model(self):
+        # Model for data extraction remains stateless
+        return self.registry.get_model(MODEL_NAME)
+
+    @property
+    def analyst_model(self):
+        # We will use this model to create a stateful chat session
+        return self.registry.get_model(MODEL_NAME, system_instruction=ANALYST_INSTRUCTIONS)
+
+    @traced("GeminiModel.start_chat_session")
     def start_chat_session(self, history):
         """Starts a new, stateful chat session, optionally loading previous history."""
         # Convert our Streamlit history to the format google-genai expects
@@ -55,38 +150,187 @@ class GeminiModel:
             genai_history.append({"role": role, "parts": [content_text]})
 
         self.chat_session = self.analyst_model.start_chat(history=genai_history)
+        self.context.reset()
+
+    def _build_chat_prompt(self, user_prompt, data_summary):
+        # Prepend data summary to analytical prompts for context
+        if data_summary:
+            return f"CONTEXTUAL FINANCIAL DATA:\n{data_summary}\n\nUSER PROMPT: {user_prompt}"
+        return user_prompt
 
+    @traced("GeminiModel.chat_with_gemini")
     def chat_with_gemini(self, user_prompt, data_summary=None):
         """Sends a message to the ongoing chat session, including data context if needed."""
         if not self.chat_session:
             # Failsafe in case chat is not started
             self.start_chat_session([])
 
-        # Prepend data summary to analytical prompts for context
-        full_prompt = user_prompt
-        if data_summary:
-            full_prompt = f"CONTEXTUAL FINANCIAL DATA:\n{data_summary}\n\nUSER PROMPT: {user_prompt}"
+        full_prompt = self._build_chat_prompt(user_prompt, data_summary)
+        count("llm.prompt_chars", len(full_prompt))
 
         try:
-            response = self.chat_session.send_message(
-                full_prompt,
-                generation_config={"response_mime_type": "application/json"}
-            )
-            return json.loads(response.text)
+            with self.registry.limiter.slot(), span("llm.send_message", prompt_chars=len(full_prompt)):
+                response = self.chat_session.send_message(
+                    full_prompt,
+                    generation_config={"response_mime_type": "application/json"}
+                )
+            with span("llm.parse_json"):
+                return json.loads(response.text)
         except Exception as e:
             return {"message": f"I apologize, but I encountered an issue. (Error: {e})"}
 
-    def structure_data_with_gemini(self, text, year):
+    def _recover_history(self):
+        """
+        Reading ChatSession.history raises once a streamed reply broke or stopped early (e.g. on a safety
+        block). Drops that turn, or starts a new session if it cannot, and returns the error; None if the
+        history is intact.
+        """
+        try:
+            self.chat_session.history
+            return None
+        except Exception as e:
+            logger.warning("Dropping a broken chat turn: %s", e)
+            try:
+                self.chat_session.rewind()
+            except Exception:
+                self.start_chat_session([])
+            # The dropped prompt may have carried the data block.
+            self.context.reset()
+            return e
+
+    def _prepare_context_turn(self, user_prompt, snapshot_df, data_key):
+        """Trims the history to the token budget and works out which data the next turn must carry."""
+        if not self.chat_session:
+            self.start_chat_session([])
+        self._recover_history()
+
+        new_history, trimmed = trim_history(self.chat_session.history, self.token_budget)
+        if new_history is not None:
+            self.chat_session.history = new_history
+            # The data block may have been summarized away; send it again.
+            self.context.reset()
+
+        data_text, data_kind = self.context.prepare(snapshot_df, data_key)
+        self.last_prompt_stats = {
+            "prompt_tokens": estimate_tokens(user_prompt) + estimate_tokens(data_text),
+            "data": data_kind,
+            "data_tokens": estimate_tokens(data_text),
+            "trimmed_messages": trimmed,
+        }
+        return data_text
+
+    @traced("GeminiModel.chat_with_context")
+    def chat_with_context(self, user_prompt, snapshot_df, data_key):
+        """
+        Like chat_with_gemini, but sends the snapshot only once per session (then only changes),
+        in a compact encoding, and keeps the history within token_budget by summarizing old turns.
+        Prompt sizes for the turn are kept in last_prompt_stats.
+        """
+        data_text = self._prepare_context_turn(user_prompt, snapshot_df, data_key)
+        response = self.chat_with_gemini(user_prompt, data_text)
+        self._recover_history()
+        self.last_prompt_stats["history_tokens"] = history_tokens(self.chat_session.history)
+        return response
+
+    def chat_stream(self, user_prompt, snapshot_df, data_key):
+        """
+        Streaming chat_with_context: yields the reply's "message" text as it arrives, before the rest of
+        the JSON (such as "plot_request") is complete. The parsed reply is left in last_response, and the
+        time to the first chunk and to the first message token in last_prompt_stats.
+        """
+        data_text = self._prepare_context_turn(user_prompt, snapshot_df, data_key)
+        full_prompt = self._build_chat_prompt(user_prompt, data_text)
+        count("llm.prompt_chars", len(full_prompt))
+        parser = StringFieldParser("message")
+        start = time.perf_counter()
+        first_chunk = first_token = None
+
+        try:
+            with self.registry.limiter.slot():
+                response = self.chat_session.send_message(
+                    full_prompt,
+                    generation_config={"response_mime_type": "application/json"},
+                    stream=True
+                )
+                for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts, e.g. the final one carrying only the finish reason
+                        continue
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    delta = parser.feed(text)
+                    if delta:
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        yield delta
+            self.last_response = parser.result()
+            if "error" in self.last_response and not parser.text:
+                # Nothing was streamed for a reply that is not a JSON object; show its text instead.
+                yield self.last_response["message"]
+        except Exception as e:
+            message = f"I apologize, but I encountered an issue. (Error: {e})"
+            self.last_response = {"message": message, "error": str(e)}
+            yield message
+
+        broken = self._recover_history()
+        if broken is not None and "error" not in self.last_response:
+            # The stream ended without raising but the reply is unusable, e.g. it stopped on a safety block.
+            message = f"I apologize, but I encountered an issue. (Error: {broken})"
+            self.last_response = {"message": message, "error": str(broken)}
+            yield message
+
+        self.last_prompt_stats.update({
+            "history_tokens": history_tokens(self.chat_session.history),
+            "ttfb_seconds": first_chunk,
+            "ttft_seconds": first_token,
+            "total_seconds": time.perf_counter() - start,
+        })
+        # Recorded after the fact: a span held open across yields would nest whatever the caller does in between.
+        tracer.record(
+            "GeminiModel.chat_stream", self.last_prompt_stats["total_seconds"], error=self.last_response.get("error"),
+            prompt_chars=len(full_prompt), ttft_seconds=first_token
+        )
+
+    def add_to_history(self, user_prompt, response_dict):
+        """Records a turn that was answered without calling the model, so later turns still see it."""
+        if not self.chat_session:
+            self.start_chat_session([])
+        self._recover_history()
+        self.chat_session.history = list(self.chat_session.history) + [
+            {"role": "user", "parts": [user_prompt]},
+            {"role": "model", "parts": [json.dumps(response_dict)]},
+        ]
+
+    def _generate_json(self, prompt, request_key):
+        def generate():
+            with span("llm.generate_content", prompt_chars=len(prompt)):
+                response = self.extraction_model.generate_content(
+                    prompt,
+                    generation_config={"temperature": 0.0, "response_mime_type": "application/json"}
+                )
+                return response.text
+
+        count("llm.prompt_chars", len(prompt))
+        count("llm.extraction_calls")
+
+        return self.registry.caller.call_once(request_key, generate)
+
+    @traced("GeminiModel.structure_data_with_gemini")
+    def structure_data_with_gemini(self, text, year, keys=None):
+        keys = keys or REQUIRED_KEYS
         prompt = f"""
         Analyze the following financial report text for the year {year}.
         Your task is to extract the specified financial metrics.
 
         Follow these rules strictly:
         1.  Return ONLY a single, valid JSON object. Do not include any other text, explanations, or markdown.
-        2.  The JSON object must contain these exact keys: {', '.join(REQUIRED_KEYS)}.
+        2.  The JSON object must contain these exact keys: {', '.join(keys)}.
         3.  Be flexible with labels: "Revenue from Operations" might appear as "Income from sales" or similar variations. Map them correctly.
         4.  If a value for a specific key cannot be found in the text, the value in the JSON must be `null`. Do not guess or make up values.
         5.  All numerical values must be in a raw number format (e.g., 123456.78). Remove all commas, currency symbols, and text like "Cr.".
+            Amounts must be in crore: divide values reported in lakh by 100 and values reported in million by 10. Per-share values are not converted.
         6.  Pay close attention to negative numbers, often in parentheses, e.g., (123.45). Convert them to negative numbers, e.g., -123.45.
         7.  The report might be for a consolidated or standalone entity. Extract the data that is most prominently displayed.
         Full Financial Report Text:
@@ -94,35 +338,142 @@ class GeminiModel:
         {text}
         ---
         """
+        # Identical concurrent requests (e.g. the same report uploaded twice) share one upstream call.
+        request_key = (hashlib.sha1(text.encode("utf-8")).hexdigest(), year, tuple(keys))
+        json_str = None
         try:
-            response = self.extraction_model.generate_content(
-                prompt,
-                generation_config={"temperature": 0.0, "response_mime_type": "application/json"}
-            )
-
-            json_str = response.text
-            data = json.loads(json_str)
-            for key in REQUIRED_KEYS:
+            json_str = self._generate_json(prompt, request_key)
+            with span("llm.parse_json", chars=len(json_str)):
+                data = json.loads(json_str)
+            for key in keys:
                 if key not in data:
                     data[key] = None
             return data
 
         except Exception as e:
-            print(f"Error during Gemini extraction or JSON parsing: {e}")
-            response_text = "No response from API."
-            if 'response' in locals() and hasattr(response, 'text'):
-                response_text = response.text
-            return {"error": f"JSON parsing failed: {str(e)}", "details": response_text}
+            logger.warning("Error during Gemini extraction or JSON parsing: %s", e)
+            if json_str is None:
+                return {"error": f"AI request failed: {str(e)}", "details": "No response from API."}
+            return {"error": f"JSON parsing failed: {str(e)}", "details": json_str}
+
+    @traced("GeminiModel.extract_window")
+    def extract_window(self, text, year, keys):
+        """Extracts candidates from one window of pages: {key: {"value", "confidence", "statement"}}."""
+        prompt = f"""
+        Below is an excerpt (some pages) of a financial report for the year {year}.
+        Extract these metrics if they appear in the excerpt: {', '.join(keys)}.
 
-    def process_pdf_pages(self, pages, year):
+        Follow these rules strictly:
+        1.  Return ONLY a single, valid JSON object whose keys are the metric names above.
+        2.  Each value must be an object: {{"value": number or null, "confidence": 0 to 1, "statement": "consolidated", "standalone" or null}}.
+            "statement" says which statement the figure was read from; "confidence" is how sure you are that the figure is the requested metric for {year}.
+        3.  If a metric does not appear in this excerpt, its value must be null. Do not guess.
+        4.  Numbers must be raw (e.g. 123456.78) and in crore: divide lakh by 100 and million by 10. Per-share values are not converted.
+        5.  Negative numbers are often in parentheses, e.g. (123.45) means -123.45.
+        Excerpt:
+        ---
+        {text}
+        ---
+        """
+        request_key = ("window", hashlib.sha1(text.encode("utf-8")).hexdigest(), year, tuple(keys))
+        try:
+            result = json.loads(self._generate_json(prompt, request_key))
+        except Exception as e:
+            logger.warning("Window extraction failed: %s", e)
+            return {"error": str(e)}
+        if not isinstance(result, dict):
+            logger.warning("Window extraction returned %s instead of an object", type(result).__name__)
+            return {"error": f"expected a JSON object, got {type(result).__name__}"}
+        return result
+
+    @traced("GeminiModel.process_pdf_pages_chunked")
+    def process_pdf_pages_chunked(self, pages, year, top_k=None, keys=None, window_tokens=WINDOW_TOKENS, workers=CHUNK_WORKERS):
         """
-        Processes the entire PDF in one go (all pages at once).
+        Map-reduce extraction for long reports: the pages are packed into token-bounded windows,
+        each window is extracted concurrently and the per-metric candidates are merged
+        (consolidated first, then highest confidence). Timings are kept in last_chunk_stats.
         """
-        combined_text = "\n\n--- PAGE BREAK ---\n\n".join(pages)
+        keys = keys or REQUIRED_KEYS
+        start = time.perf_counter()
+        selected, self.last_locator_stats = page_locator.select(pages, top_k)
+        windows = page_windows(selected, window_tokens, self.last_locator_stats["page_numbers"])
+
+        def run(window):
+            window_start = time.perf_counter()
+            return self.extract_window(window[1], year, keys), time.perf_counter() - window_start
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(windows)))) as executor:
+            outcomes = list(executor.map(run, windows))
 
-        extracted_data = self.structure_data_with_gemini(combined_text[:900_000], year)
+        results = [result for result, _ in outcomes if isinstance(result, dict) and "error" not in result]
+        failed = len(outcomes) - len(results)
+        self.last_chunk_stats = {
+            "windows": len(windows),
+            "failed_windows": failed,
+            "window_pages": [numbers for numbers, _ in windows],
+            "window_seconds": [round(seconds, 3) for _, seconds in outcomes],
+        }
+        if not results:
+            self.last_chunk_stats["total_seconds"] = round(time.perf_counter() - start, 3)
+            errors = [result.get("error") for result, _ in outcomes if isinstance(result, dict)]
+            return {"error": "Failed to extract data from the report.", "details": errors[0] if errors else "No pages to process."}
+
+        data, conflicts = merge_candidates(results, keys)
+        self.last_chunk_stats["conflicts"] = conflicts
+        self.last_chunk_stats["total_seconds"] = round(time.perf_counter() - start, 3)
+        if failed:
+            logger.warning("%d of %d windows failed; merged the rest", failed, len(windows))
+        return data
+
+    @traced("GeminiModel.process_pdf_pages")
+    def process_pdf_pages(self, pages, year, top_k=PAGE_TOP_K, keys=None, chunked=None):
+        """
+        Processes the PDF in one go, sending only the top_k pages ranked by the page locator.
+        Pass top_k=None to send every page. The size of the cut is kept in last_locator_stats.
+        Text longer than SINGLE_SHOT_CHARS is extracted in windows instead of being truncated;
+        chunked=True/False forces either path.
+        """
+        selected, stats = page_locator.select(pages, top_k)
+        combined_text = PAGE_SEPARATOR.join(selected)
+        if chunked or (chunked is None and len(combined_text) > SINGLE_SHOT_CHARS):
+            return self.process_pdf_pages_chunked(pages, year, top_k=top_k, keys=keys)
+        self.last_locator_stats = stats
+
+        extracted_data = self.structure_data_with_gemini(combined_text[:SINGLE_SHOT_CHARS], year, keys=keys)
 
         if "error" in extracted_data:
             return {"error": "Failed to extract data from the report.", "details": extracted_data.get("details")}
 
-        return extracted_data 
\ No newline at end of file
+        return extracted_data
+
+    @traced("GeminiModel.extract_financials")
+    def extract_financials(self, pdf_path, pages, year, top_k=PAGE_TOP_K):
+        """
+        Reads the metrics from the tables of the top-ranked pages locally and asks the LLM only for
+        the keys the table extractor could not resolve confidently. pages must hold one entry per
+        PDF page (parse_pdf(..., keep_empty=True)). Where each value came from is kept in
+        last_extraction_sources. If the LLM call fails, the error is returned with the confident
+        table values under "partial".
+        """
+        from utils.table_extractor import CONFIDENCE_THRESHOLD, extract_table_metrics
+
+        _, stats = page_locator.select(pages, top_k)
+        local = extract_table_metrics(pdf_path, year, stats["page_numbers"])
+        data = {
+            key: local[key]["value"] for key in REQUIRED_KEYS
+            if key in local and local[key]["confidence"] >= CONFIDENCE_THRESHOLD
+        }
+        self.last_extraction_sources = {key: "tables" for key in data}
+
+        missing = [key for key in REQUIRED_KEYS if key not in data]
+        if missing:
+            llm_data = self.process_pdf_pages(pages, year, top_k=top_k, keys=missing)
+            if "error" in llm_data:
+                return dict(llm_data, partial=data)
+            for key in missing:
+                data[key] = llm_data.get(key)
+                self.last_extraction_sources[key] = "llm"
+        else:
+            self.last_locator_stats = dict(stats, pages_out=0, chars_out=0, reduction=1.0)
+
+        return {key: data[key] for key in REQUIRED_KEYS}
@@ -0,0 +1,84 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+TOKEN_RE = re.compile(r"[a-z]+")
+NUMBER_RE = re.compile(r"\(?-?\d[\d,]*(?:\.\d+)?\)?")
+
+STOPWORDS = {"and", "of", "the", "from", "before", "for", "in", "to", "per", "total"}
+
+# Headings that mark the primary statements, on top of the REQUIRED_KEYS labels themselves.
+STATEMENT_TERMS = [
+    "balance sheet", "statement of profit and loss", "profit and loss", "cash flow statement",
+    "consolidated", "standalone", "crore", "lakh", "equity and liabilities", "revenue",
+]
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_lexicon(keys, extra_terms=STATEMENT_TERMS):
+    """Weights every vocabulary word by how specific it is to the labels it appears in."""
+    counts = Counter()
+    for label in list(keys) + list(extra_terms):
+        counts.update(set(tokenize(label)) - STOPWORDS)
+    return {term: 1.0 / count for term, count in counts.items()}
+
+
+class PageLocator:
+    """Ranks report pages by how likely they are to hold the financial statements."""
+
+    def __init__(self, keys, extra_terms=STATEMENT_TERMS):
+        self.lexicon = build_lexicon(keys, extra_terms)
+        self.labels = [label.lower() for label in keys]
+
+    def build_index(self, pages):
+        """Inverted index of lexicon terms: term -> {page index: term frequency}."""
+        index = defaultdict(dict)
+        for page_number, text in enumerate(pages):
+            for term, count in Counter(t for t in tokenize(text) if t in self.lexicon).items():
+                index[term][page_number] = count
+        return index
+
+    def score_pages(self, pages):
+        index = self.build_index(pages)
+        scores = [0.0] * len(pages)
+
+        # Keyword density: lexicon weight x dampened term frequency x inverse page frequency.
+        for term, postings in index.items():
+            idf = math.log(1 + len(pages) / len(postings))
+            weight = self.lexicon[term] * idf
+            for page_number, count in postings.items():
+                scores[page_number] += weight * (1 + math.log(count))
+
+        for page_number, text in enumerate(pages):
+            lowered = text.lower()
+            label_hits = sum(1 for label in self.labels if label in lowered)
+            lines = [line for line in text.splitlines() if line.strip()]
+            numeric_lines = sum(1 for line in lines if len(NUMBER_RE.findall(line)) >= 2)
+            table_density = numeric_lines / len(lines) if lines else 0.0
+            scores[page_number] += 2.0 * label_hits + 10.0 * table_density
+
+        return scores
+
+    def select(self, pages, top_k=25):
+        """Returns the top_k highest-scoring pages in their original order, plus a report of the cut."""
+        if top_k is None or len(pages) <= top_k:
+            kept = list(range(len(pages)))
+        else:
+            scores = self.score_pages(pages)
+            kept = sorted(sorted(range(len(pages)), key=lambda i: scores[i], reverse=True)[:top_k])
+
+        selected = [pages[i] for i in kept]
+        chars_in = sum(len(p) for p in pages)
+        chars_out = sum(len(p) for p in selected)
+        stats = {
+            "pages_in": len(pages),
+            "pages_out": len(selected),
+            "page_numbers": [i + 1 for i in kept],
+            "chars_in": chars_in,
+            "chars_out": chars_out,
+            "reduction": 1 - chars_out / chars_in if chars_in else 0.0,
+        }
+        return selected, stats
@@ -0,0 +1,135 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seed rows for the known groups, applied only to empty tables.
+SEED_USERS = {
+    "reliance": [
+        ('reliance_analyst', 'reliance123', 'analyst'),
+        ('jio_ceo', 'jio12345', 'ceo'),
+        ('reliance_owner', 'reliance123', 'top_management'),
+    ],
+    "tata": [
+        ('tata_analyst', 'tata1234', 'analyst'),
+        ('tata_steel_ceo', 'steel1234', 'ceo'),
+        ('tata_owner', 'tata1234', 'top_management'),
+    ],
+}
+
+SEED_COMPANIES = {
+    "reliance": [('Reliance Jio', 'Reliance'), ('Reliance Trends', 'Reliance'), ('Reliance Industries', 'Reliance')],
+    "tata": [('Tata Steel', 'TATA'), ('Tata Motors', 'TATA'), ('Tata Salt', 'TATA')],
+}
+
+SEED_ACCESS = {
+    "reliance": [('jio_ceo', 'Reliance Jio')],
+    "tata": [('tata_steel_ceo', 'Tata Steel')],
+}
+
+
+def _create_tables(cursor, group_name):
+    cursor.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS companies (id INTEGER PRIMARY KEY, name TEXT UNIQUE, group_name TEXT)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS user_company_access (user_id INTEGER, company_id INTEGER, PRIMARY KEY (user_id, company_id))")
+    cursor.execute("CREATE TABLE IF NOT EXISTS financial_data (id INTEGER PRIMARY KEY, company_id INTEGER, year INTEGER, metric TEXT, value REAL, source_document TEXT, UNIQUE(company_id, year, metric))")
+
+
+def _seed_data(cursor, group_name):
+    if group_name in SEED_USERS and cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+        cursor.executemany("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", SEED_USERS[group_name])
+
+    if group_name in SEED_COMPANIES and cursor.execute("SELECT COUNT(*) FROM companies").fetchone()[0] == 0:
+        cursor.executemany("INSERT INTO companies (name, group_name) VALUES (?, ?)", SEED_COMPANIES[group_name])
+
+    if group_name in SEED_ACCESS and cursor.execute("SELECT COUNT(*) FROM user_company_access").fetchone()[0] == 0:
+        cursor.executemany(
+            "INSERT INTO user_company_access (user_id, company_id) VALUES ((SELECT id FROM users WHERE username=?), (SELECT id FROM companies WHERE name=?))",
+            SEED_ACCESS[group_name]
+        )
+
+
+def _add_financial_data_covering_index(cursor, group_name):
+    # Lets per-company snapshot reads be answered from the index alone.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_financial_data_covering ON financial_data (company_id, year, metric, value)")
+
+
+def _create_jobs_table(cursor, group_name):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, company_id INTEGER, year INTEGER, "
+        "source_type TEXT, source TEXT, source_name TEXT, status TEXT, stage TEXT, progress REAL DEFAULT 0, "
+        "attempts INTEGER DEFAULT 0, max_attempts INTEGER DEFAULT 3, next_attempt_at REAL DEFAULT 0, "
+        "message TEXT, created_by TEXT, created_at REAL, updated_at REAL)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, next_attempt_at)")
+
+
+def _add_job_batches(cursor, group_name):
+    cursor.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+    cursor.execute("ALTER TABLE jobs ADD COLUMN started_at REAL")
+    cursor.execute("ALTER TABLE jobs ADD COLUMN finished_at REAL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id)")
+
+
+def _create_derived_metrics(cursor, group_name):
+    from utils.analytics import refresh_derived_metrics
+
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS derived_metrics (company_id INTEGER, year INTEGER, metric TEXT, value REAL, "
+        "computed_at REAL, PRIMARY KEY (company_id, year, metric))"
+    )
+    refresh_derived_metrics(cursor)
+
+
+def _create_data_versions(cursor, group_name):
+    # One counter per company (0 for the companies table), bumped inside every write transaction so
+    # caches in any process can tell that the data changed.
+    cursor.execute("CREATE TABLE IF NOT EXISTS data_versions (company_id INTEGER PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)")
+
+
+def _add_job_owner(cursor, group_name):
+    # host:pid of the worker process running the job, so a restart only requeues jobs of dead workers.
+    cursor.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+
+# Migration N brings the schema from version N-1 to version N. Only ever append to this list.
+MIGRATIONS = [
+    _create_tables,
+    _seed_data,
+    _add_financial_data_covering_index,
+    _create_jobs_table,
+    _add_job_batches,
+    _create_derived_metrics,
+    _create_data_versions,
+    _add_job_owner,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, group_name):
+    """Applies any pending migrations and returns the versions that were applied."""
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return []
+
+    applied = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-read under the write lock in case another process migrated first.
+        version = get_schema_version(conn)
+        cursor = conn.cursor()
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(cursor, group_name)
+            applied.append(number)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if applied:
+        logger.info("Migrated %s database to schema version %d (applied %s)", group_name, SCHEMA_VERSION, applied)
+    return applied
@@ -1,22 +1,108 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
 import pdfplumber
 
-def parse_pdf(pdf_path):
+from utils.tracing import count, traced
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKERS = min(4, os.cpu_count() or 1)
+PAGES_PER_TASK = 8
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """Extracts the text of pages [start, stop) in a worker process."""
+    texts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            texts.append(page.extract_text())
+            page.close()
+    return texts
+
+
+def count_pages(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def _terminate(executor):
+    """Shuts a pool down without waiting for it; a worker stuck on a page would otherwise live on."""
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout=5)
+
+
+def iter_pdf_pages(pdf_path, workers=PDF_WORKERS, pages_per_task=PAGES_PER_TASK, page_timeout=30):
+    """
+    Yields (page_number, text) in page order while page ranges are extracted in a process pool.
+    A range is yielded as soon as it and every range before it have finished. A range that exceeds
+    page_timeout seconds per page is yielded as empty pages, so later page numbers stay correct;
+    its workers are terminated and the remaining ranges continue in a fresh pool.
+    """
+    total = count_pages(pdf_path)
+    pending = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+    # Workers are spawned rather than forked: the app and job workers are multi-threaded.
+    context = multiprocessing.get_context("spawn")
+
+    while pending:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        timed_out = False
+        try:
+            futures = [executor.submit(_extract_page_range, pdf_path, start, stop) for start, stop in pending]
+            for index, ((start, stop), future) in enumerate(zip(pending, futures)):
+                try:
+                    texts = future.result(timeout=page_timeout * (stop - start))
+                except TimeoutError:
+                    logger.warning("Timed out extracting pages %d-%d of %s, leaving them empty.", start + 1, stop, pdf_path)
+                    timed_out = True
+                    _terminate(executor)
+                    texts = [""] * (stop - start)
+                for offset, text in enumerate(texts):
+                    yield start + offset + 1, text
+                if timed_out:
+                    pending = pending[index + 1:]
+                    break
+            else:
+                pending = []
+        finally:
+            if not timed_out:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+@traced("parse_pdf")
+def parse_pdf(pdf_path, workers=1, page_timeout=30, keep_empty=False):
     """
     Extracts text from a PDF file, returning a list where each item is the text of one page.
+    With workers > 1 the pages are extracted in parallel by iter_pdf_pages. With keep_empty,
+    pages without text are kept as "" so that list positions match PDF page numbers.
     """
-    page_texts = [] 
+    page_texts = []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    page_texts.append(text)
-        
-        if not page_texts:
-            print("Warning: pdfplumber extracted no pages with text.")
+        if workers > 1:
+            for _, text in iter_pdf_pages(pdf_path, workers=workers, page_timeout=page_timeout):
+                if text or keep_empty:
+                    page_texts.append(text or "")
+        else:
+            with pdfplumber.open(pdf_path) as pdf:
+                for page in pdf.pages:
+                    text = page.extract_text()
+                    if text or keep_empty:
+                        page_texts.append(text or "")
+
+        count("pdf.pages", len(page_texts))
+        count("pdf.chars", sum(len(text) for text in page_texts))
+        if not any(page_texts):
+            logger.warning("pdfplumber extracted no pages with text from %s", pdf_path)
             return None
-        
+
         return page_texts
     except Exception as e:
-        print(f"Error reading PDF with pdfplumber: {e}")
-        return None 
\ No newline at end of file
+        logger.warning("Error reading %s with pdfplumber: %s", pdf_path, e)
+        return None
+
@@ -1,7 +1,14 @@
+import json
+
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 
+from utils.cache import LRUCache
+
+# Serialized figures of chat plot requests, shared by all sessions.
+figure_cache = LRUCache(max_entries=512, max_bytes=64 * 1024 * 1024)
+
 def create_line_chart(df, metric, title):
     """Creates a line chart for a specific metric over the years."""
     if metric not in df.index:
@@ -50,14 +57,19 @@ def create_asset_liability_chart(df, title):
     return fig
 
 def create_growth_chart(df, metric, title):
-    """Calculates and plots the year-over-year growth of a specific metric."""
-    if metric not in df.index:
+    """
+    Plots the year-over-year growth of a specific metric. Uses the precomputed "<metric> YoY %" row
+    when df carries one (see utils/analytics.py), otherwise calculates it from the metric.
+    """
+    if f"{metric} YoY %" in df.index:
+        growth = df.loc[f"{metric} YoY %"].dropna()
+    elif metric in df.index:
+        data = df.loc[metric]
+        growth = data.pct_change() * 100 # Calculate percentage growth
+        growth = growth.dropna() # Remove the first year which has no growth value
+    else:
         return None
 
-    data = df.loc[metric]
-    growth = data.pct_change() * 100 # Calculate percentage growth
-    growth = growth.dropna() # Remove the first year which has no growth value
-
     growth_df = growth.reset_index()
     growth_df.columns = ['Year', 'YoY Growth (%)']
 
@@ -69,4 +81,80 @@ def create_growth_chart(df, metric, title):
         labels={'Year': 'Year', 'YoY Growth (%)': 'YoY Growth (%)'}
     )
     fig.update_traces(texttemplate='%{y:.2f}%', textposition='outside')
-    return fig
\ No newline at end of file
+    return fig
+
+
+def _long_by_company(df, value_name):
+    """Turns a company x year frame into (Company, Year, value) rows for plotly express."""
+    long = df.rename_axis(index='Company', columns='Year').reset_index().melt(id_vars='Company', var_name='Year', value_name=value_name)
+    return long.dropna(subset=[value_name])
+
+def create_multi_line_chart(df, metric, title):
+    """Creates a line chart of one metric over the years with one line per company (df is company x year)."""
+    if df.empty:
+        return None
+    fig = px.line(_long_by_company(df, metric), x='Year', y=metric, color='Company', title=title, markers=True)
+    return fig
+
+def create_multi_bar_chart(df, metric, title):
+    """Creates a grouped bar chart of one metric, one bar per company in each year (df is company x year)."""
+    if df.empty:
+        return None
+    long = _long_by_company(df, metric)
+    long['Year'] = long['Year'].astype(str)
+    fig = px.bar(long, x='Year', y=metric, color='Company', barmode='group', title=title)
+    return fig
+
+def create_multi_asset_liability_chart(df, title):
+    """Creates a grouped bar chart comparing assets and liabilities per company (df is company x metric for one year)."""
+    metrics_to_plot = ['Total Assets', 'Total Liabilities']
+    if df.empty or not all(metric in df.columns for metric in metrics_to_plot):
+        return None
+
+    fig = go.Figure()
+    for metric in metrics_to_plot:
+        fig.add_trace(go.Bar(x=df.index, y=df[metric], name=metric))
+    fig.update_layout(title_text=title, barmode='group', xaxis_title='Company', yaxis_title='Value')
+    return fig
+
+def create_multi_growth_chart(df, metric, title):
+    """
+    Plots year-over-year growth per company. df is either the metric itself (company x year),
+    from which growth between adjacent columns is calculated, or its precomputed "<metric> YoY %" frame.
+    """
+    if df.empty:
+        return None
+    if metric.endswith('YoY %'):
+        growth = df
+    else:
+        previous = df.shift(axis=1)
+        growth = (df - previous) / previous.abs().where(previous != 0) * 100
+    fig = create_multi_line_chart(growth, 'YoY Growth (%)', title)
+    fig.add_hline(y=0, line_dash='dot', line_color='grey')
+    return fig
+
+# plot_request "type" -> builder(df, metric, title)
+PLOT_BUILDERS = {
+    'line': create_line_chart,
+    'bar': create_bar_chart,
+    'asset_liability_comparison': lambda df, metric, title: create_asset_liability_chart(df, title),
+    'growth': create_growth_chart,
+}
+
+def render_plot(df, plot_request, data_key):
+    """
+    Builds the figure for a chat plot_request, memoized as figure JSON by (type, metric, title, data_key)
+    so replaying the chat history does not rebuild figures. Returns a figure dict for st.plotly_chart,
+    or None if the plot cannot be drawn from df.
+    """
+    plot_type = plot_request.get('type')
+    metric = plot_request.get('metric')
+    title = plot_request.get('title')
+    key = ('figure', plot_type, metric, title, data_key)
+    figure_json = figure_cache.get(key)
+    if figure_json is None:
+        builder = PLOT_BUILDERS.get(plot_type)
+        fig = builder(df, metric, title) if builder else None
+        figure_json = fig.to_json() if fig is not None else 'null'
+        figure_cache.put(key, figure_json)
+    return json.loads(figure_json)
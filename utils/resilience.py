@@ -0,0 +1,200 @@
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 4
+BASE_DELAY = 1.0
+MAX_DELAY = 30.0
+RATE_LIMIT_PAUSE = 10.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "Timeout", "ConnectionError",
+}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+def status_code(exc):
+    """HTTP-ish status of an SDK or transport error, if it carries one."""
+    for attr in ("code", "status_code", "status"):
+        value = getattr(exc, attr, None)
+        if callable(value):
+            try:
+                value = value()
+            except Exception:
+                value = None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def is_rate_limited(exc):
+    return status_code(exc) == 429 or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def is_retryable(exc):
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return status_code(exc) in RETRYABLE_STATUS or type(exc).__name__ in RETRYABLE_NAMES
+
+
+def backoff_delay(attempt, base=BASE_DELAY, cap=MAX_DELAY):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive upstream failures and rejects calls for
+    reset_timeout seconds; then lets one trial call through (half-open) to decide whether to close.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpen("The AI service is failing repeatedly; not calling it for now.")
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "half_open":
+                if self._trial_running:
+                    raise CircuitOpen("The AI service is recovering; waiting for a trial call to finish.")
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_rate_limited(self):
+        """A 429: the service is up but throttling, so it counts as neither a failure nor a success."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("Circuit breaker opened after %d failures", self.failures)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class RequestCoalescer:
+    """Runs one call per key at a time; concurrent callers with the same key share its result."""
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def run(self, key, fn):
+        with self._lock:
+            entry = self._inflight.get(key)
+            leader = entry is None
+            if leader:
+                entry = {"done": threading.Event(), "result": None, "error": None}
+                self._inflight[key] = entry
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            entry["done"].wait()
+            if entry["error"] is not None:
+                raise entry["error"]
+            return entry["result"]
+
+        try:
+            entry["result"] = fn()
+            return entry["result"]
+        except BaseException as e:
+            entry["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            entry["done"].set()
+
+
+class ResilientCaller:
+    """
+    Wraps upstream calls with the shared CallLimiter, a circuit breaker and retries with jittered
+    exponential backoff. A 429 also pauses the limiter's token bucket so every caller slows down,
+    not just the one that was rejected; only other upstream failures count toward the breaker.
+    """
+
+    def __init__(self, limiter, breaker=None, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY, rate_limit_pause=RATE_LIMIT_PAUSE, sleep=time.sleep):
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_pause = rate_limit_pause
+        self.sleep = sleep
+        self.coalescer = RequestCoalescer()
+        self.retries = 0
+        self.rate_limited = 0
+
+    def call(self, fn):
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            try:
+                with self.limiter.slot():
+                    result = fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    # The service answered; the request itself was bad.
+                    self.breaker.record_success()
+                    raise
+                if is_rate_limited(e):
+                    # The bucket pause slows everyone down; a 429 burst must not open the circuit.
+                    self.breaker.record_rate_limited()
+                    self.rate_limited += 1
+                    self.limiter.bucket.pause(self.rate_limit_pause)
+                else:
+                    self.breaker.record_failure()
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                self.retries += 1
+                logger.warning("Upstream call failed (%s); retry %d in %.1fs", e, attempt + 1, delay)
+                self.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    def call_once(self, key, fn):
+        """Like call(), but identical concurrent requests (same key) share one upstream call."""
+        return self.coalescer.run(key, lambda: self.call(fn))
+
+    def metrics(self):
+        return {
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "coalesced": self.coalescer.coalesced,
+            "circuit": self.breaker.state,
+        }
@@ -0,0 +1,127 @@
+import re
+import threading
+from collections import defaultdict
+
+from utils.cache import LRUCache
+
+RESPONSE_TTL = 6 * 60 * 60
+SIMILARITY_THRESHOLD = 0.95
+
+FILLER_WORDS = {"please", "can", "could", "you", "me", "the", "a", "an", "of", "for", "show", "tell", "give", "what", "is", "are"}
+
+# Prompts that lean on earlier turns cannot be answered from another conversation's reply.
+CONTEXT_WORDS = {"it", "that", "this", "those", "these", "them", "previous", "above", "again", "earlier", "last", "same"}
+
+# Words that change what a reply must contain: metric names and chart requests. Near matches must agree on all of them,
+# so "current liabilities" never answers "non-current liabilities" and "revenue growth" never reuses a "revenue" chart.
+KEY_WORDS = {
+    "revenue", "operations", "other", "income", "total", "profit", "before", "tax", "net", "equity", "assets",
+    "liabilities", "non", "current", "cash", "equivalents", "earnings", "per", "share", "eps", "basic",
+    "ratio", "margin", "return", "debt", "yoy", "cagr", "growth", "trend",
+    "plot", "chart", "graph", "line", "bar", "pie", "compare", "comparison", "versus", "vs",
+}
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_prompt(prompt):
+    return " ".join(w for w in WORD_RE.findall(prompt.lower()) if w not in FILLER_WORDS)
+
+
+def is_self_contained(prompt):
+    return not (set(WORD_RE.findall(prompt.lower())) & CONTEXT_WORDS)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Jaccard similarity of character trigrams."""
+    ta, tb = trigrams(a), trigrams(b)
+    return len(ta & tb) / len(ta | tb) if ta and tb else 0.0
+
+
+class ResponseCache:
+    """
+    Process-wide cache of chat replies keyed by (scope, normalized prompt), where the scope is
+    (group, company_id, data version). Near-identical prompts can match through a small trigram
+    index kept per scope when fuzzy is on; a near match must reach threshold and name the same
+    KEY_WORDS and numbers. Entries expire after ttl seconds and are evicted least-recently-used.
+    """
+
+    def __init__(self, max_entries=2048, ttl=RESPONSE_TTL, fuzzy=False, threshold=SIMILARITY_THRESHOLD):
+        self._cache = LRUCache(max_entries=max_entries, max_bytes=32 * 1024 * 1024, ttl=ttl)
+        self.fuzzy = fuzzy
+        self.threshold = threshold
+        self.fuzzy_hits = 0
+        self._index = {}  # scope -> {trigram: set of normalized prompts}
+        self._lock = threading.Lock()
+
+    def get(self, scope, prompt):
+        if not is_self_contained(prompt):
+            return None
+        normalized = normalize_prompt(prompt)
+        response = self._cache.get((scope, normalized))
+        if response is not None or not self.fuzzy:
+            return response
+
+        match = self._closest(scope, normalized)
+        if match is None:
+            return None
+        response = self._cache.get((scope, match))
+        if response is None:
+            self._forget(scope, match)
+        else:
+            self.fuzzy_hits += 1
+        return response
+
+    def put(self, scope, prompt, response):
+        if not is_self_contained(prompt):
+            return
+        normalized = normalize_prompt(prompt)
+        self._cache.put((scope, normalized), response)
+        with self._lock:
+            # Replies for an older data version of the same company can never match again.
+            for old_scope in [s for s in self._index if s[:-1] == scope[:-1] and s != scope]:
+                del self._index[old_scope]
+            index = self._index.setdefault(scope, defaultdict(set))
+            for gram in trigrams(normalized):
+                index[gram].add(normalized)
+        self._cache.discard_where(lambda key: key[0][:-1] == scope[:-1] and key[0] != scope)
+
+    def _closest(self, scope, normalized):
+        numbers = set(re.findall(r"\d+", normalized))
+        key_words = set(normalized.split()) & KEY_WORDS
+        with self._lock:
+            index = self._index.get(scope)
+            if not index:
+                return None
+            candidates = set()
+            for gram in trigrams(normalized):
+                candidates |= index.get(gram, set())
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            # Never reuse an answer about different years or figures.
+            if set(re.findall(r"\d+", candidate)) != numbers:
+                continue
+            # Nor an answer about other metrics or another kind of chart.
+            if set(candidate.split()) & KEY_WORDS != key_words:
+                continue
+            score = similarity(normalized, candidate)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _forget(self, scope, normalized):
+        with self._lock:
+            index = self._index.get(scope, {})
+            for gram in trigrams(normalized):
+                index.get(gram, set()).discard(normalized)
+
+    def stats(self):
+        return dict(self._cache.stats(), fuzzy_hits=self.fuzzy_hits, scopes=len(self._index))
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,167 @@
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from utils.database import DATA_DIR, Database
+from utils.migrations import SEED_COMPANIES
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Every <group>.db file in DATA_DIR is a shard.
+FANOUT_WORKERS = 8
+# SQLite's default limit on attached databases per connection.
+MAX_ATTACHED = 10
+
+
+class ShardRouter:
+    """
+    Discovers group databases in data_dir and routes to one Database (and so one connection pool)
+    per group. Cross-group reads either fan out to the shards in parallel or run as one UNION ALL
+    query over ATTACHed shards; both return merged results tagged with group_name, together with the
+    errors of any shards that failed, so a partial result is never mistaken for a complete one.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, workers=FANOUT_WORKERS):
+        self.data_dir = data_dir
+        self.workers = workers
+        self._databases = {}
+        self._groups = None
+        self._groups_mtime = None
+        self._lock = threading.Lock()
+
+    def groups(self):
+        """Sorted group names: every <group>.db in data_dir plus the seeded groups, rescanned when the directory changes."""
+        try:
+            mtime = os.stat(self.data_dir).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._groups is None or mtime != self._groups_mtime:
+            found = set(SEED_COMPANIES)
+            if mtime is not None:
+                with os.scandir(self.data_dir) as entries:
+                    found.update(e.name[:-3] for e in entries if e.is_file() and e.name.endswith(".db"))
+            self._groups, self._groups_mtime = sorted(found), mtime
+        return list(self._groups)
+
+    def path(self, group_name):
+        return os.path.join(self.data_dir, f"{group_name}.db")
+
+    def get(self, group_name):
+        """The Database for a group, set up once per process."""
+        db = self._databases.get(group_name)
+        if db is None:
+            with self._lock:
+                db = self._databases.get(group_name)
+                if db is None:
+                    db = Database(group_name, db_path=self.path(group_name))
+                    db.setup_database()
+                    self._databases[group_name] = db
+        return db
+
+    def fan_out(self, fn, groups=None):
+        """
+        Runs fn(db) for each group in parallel and returns ({group: result}, {group: error}).
+        A failing shard does not fail the others.
+        """
+        groups = groups or self.groups()
+        results, errors = {}, {}
+        with span("shards.fan_out", shards=len(groups)):
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(groups)))) as executor:
+                futures = {group: executor.submit(lambda g: fn(self.get(g)), group) for group in groups}
+                for group, future in futures.items():
+                    try:
+                        results[group] = future.result()
+                    except Exception as e:
+                        logger.error("Shard %s failed: %s", group, e)
+                        errors[group] = e
+        return results, errors
+
+    def query(self, sql, params=(), groups=None):
+        """
+        Runs the same read query on every shard in parallel. Returns (frame, errors): the rows merged into
+        one DataFrame with a group_name column, and {group: error} for the shards that failed.
+        """
+        def run(db):
+            with db.get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(sql, params)
+                return [d[0] for d in cursor.description], cursor.fetchall()
+
+        results, errors = self.fan_out(run, groups)
+        return _merge({group: pd.DataFrame.from_records(rows, columns=columns) for group, (columns, rows) in results.items()}), errors
+
+    def attached_query(self, select, params=(), groups=None):
+        """
+        Runs `select` against each shard through ATTACH on one in-memory connection, as a UNION ALL
+        (in batches of MAX_ATTACHED shards). `select` names the shard's tables with a {db} prefix,
+        e.g. "SELECT company_id, value FROM {db}.financial_data WHERE year = ?"; params apply to each shard.
+        Returns (frame, errors) like query; a shard that cannot be attached is left out of its batch, and
+        a failing batch query fails every shard in the batch.
+        """
+        groups = groups or self.groups()
+        frames, errors = [], {}
+        with span("shards.attached_query", shards=len(groups)):
+            for start in range(0, len(groups), MAX_ATTACHED):
+                conn = sqlite3.connect("file::memory:", uri=True)
+                try:
+                    attached = []
+                    for group in groups[start:start + MAX_ATTACHED]:
+                        try:
+                            self.get(group)  # makes sure the shard exists and is migrated
+                            uri = "file:" + os.path.abspath(self.path(group)) + "?mode=ro"
+                            conn.execute(f"ATTACH DATABASE ? AS s{len(attached)}", (uri,))
+                        except Exception as e:
+                            logger.error("Shard %s failed: %s", group, e)
+                            errors[group] = e
+                            continue
+                        attached.append(group)
+                    if not attached:
+                        continue
+                    sql = " UNION ALL ".join(
+                        f"SELECT ? AS group_name, * FROM ({select.format(db=f's{i}')})" for i in range(len(attached))
+                    )
+                    args = [value for group in attached for value in (group, *params)]
+                    try:
+                        cursor = conn.execute(sql, args)
+                        frames.append(pd.DataFrame.from_records(cursor.fetchall(), columns=[d[0] for d in cursor.description]))
+                    except sqlite3.Error as e:
+                        logger.error("Query over shards %s failed: %s", attached, e)
+                        errors.update({group: e for group in attached})
+                finally:
+                    conn.close()
+        return (pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()), errors
+
+    def financials_frame(self, groups=None):
+        """
+        Every group's financial_data as one long frame (group_name, company_id, company, year, metric, value),
+        returned with {group: error} for the shards that failed.
+        """
+        def load(db):
+            companies = {c["id"]: c["name"] for c in db.get_all_companies()}
+            frame = db.get_financials_frame(list(companies))
+            frame.insert(1, "company", frame["company_id"].map(companies))
+            return frame
+
+        results, errors = self.fan_out(load, groups)
+        return _merge(results), errors
+
+
+def _merge(frames):
+    frames = [frame.assign(group_name=group) for group, frame in frames.items() if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    merged = pd.concat(frames, ignore_index=True)
+    return merged[["group_name"] + [c for c in merged.columns if c != "group_name"]]
+
+
+router = ShardRouter()
+
+
+def list_groups():
+    return router.groups()
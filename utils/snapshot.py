@@ -0,0 +1,279 @@
+"""
+Columnar export/import of a group's companies and financial_data.
+
+A snapshot is a directory holding one .npy file per column plus manifest.json. Metric names and
+source documents are dictionary-encoded (small integer codes plus a list in the manifest), and
+the columns can be memory-mapped read-only, so other tools can read a group's data without SQLite.
+
+    python -m utils.snapshot export reliance [--out <DATA_DIR>/snapshots/reliance]
+    python -m utils.snapshot import reliance data/snapshots/reliance [--merge]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import FinancialCube, refresh_derived_metrics
+from utils.database import DATA_DIR, Database, bump_data_versions
+from utils.migrations import SCHEMA_VERSION
+from utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+SNAPSHOT_ROOT = os.path.join(DATA_DIR, "snapshots")
+MANIFEST = "manifest.json"
+
+# column -> dtype of its .npy file
+COLUMNS = {
+    "company_id": np.int32,
+    "year": np.int16,
+    "metric": np.int16,  # index into manifest["metrics"]
+    "value": np.float64,
+    "source": np.int32,  # index into manifest["sources"], -1 for none
+}
+
+
+def _checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode(values):
+    """Dictionary-encodes a column of strings (None allowed) into (codes, categories)."""
+    codes, categories = pd.factorize(pd.Series(values, dtype=object), sort=True, use_na_sentinel=True)
+    return codes, [str(c) for c in categories]
+
+
+@traced("snapshot.export")
+def export_snapshot(db, path=None):
+    """Writes db's companies and financial_data to a snapshot directory and returns its manifest."""
+    path = path or os.path.join(SNAPSHOT_ROOT, db.group_name)
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        companies = cursor.execute("SELECT id, name, group_name FROM companies ORDER BY id").fetchall()
+        rows = cursor.execute(
+            "SELECT company_id, year, metric, value, source_document FROM financial_data ORDER BY company_id, year, metric"
+        ).fetchall()
+
+    frame = pd.DataFrame.from_records(rows, columns=["company_id", "year", "metric", "value", "source"])
+    metric_codes, metrics = _encode(frame["metric"])
+    source_codes, sources = _encode(frame["source"])
+    columns = {
+        "company_id": frame["company_id"].to_numpy(),
+        "year": frame["year"].to_numpy(),
+        "metric": metric_codes,
+        "value": frame["value"].to_numpy(dtype=float),
+        "source": source_codes,
+    }
+
+    # Written next to the target and renamed into place at the end, so readers never see half a snapshot.
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".snapshot-", dir=parent)
+    try:
+        files = {}
+        for name, dtype in COLUMNS.items():
+            filename = f"{name}.npy"
+            np.save(os.path.join(staging, filename), np.asarray(columns[name], dtype=dtype))
+            files[name] = {"file": filename, "dtype": np.dtype(dtype).str, "sha256": _checksum(os.path.join(staging, filename))}
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "group_name": db.group_name,
+            "schema_version": SCHEMA_VERSION,
+            "created_at": time.time(),
+            "rows": len(frame),
+            "companies": [{"id": c[0], "name": c[1], "group_name": c[2]} for c in companies],
+            "metrics": metrics,
+            "sources": sources,
+            "columns": files,
+        }
+        with open(os.path.join(staging, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        # A directory cannot be replaced in one step: the old snapshot is renamed aside first, so the
+        # path is only missing between the two renames and the old copy is restored if the swap fails.
+        old = None
+        if os.path.exists(path):
+            old = f"{staging}.old"
+            os.replace(path, old)
+        try:
+            os.replace(staging, path)
+        except OSError:
+            if old is not None:
+                os.replace(old, path)
+            raise
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+    logger.info("Exported %d rows for %d companies of %s to %s", len(frame), len(companies), db.group_name, path)
+    return manifest
+
+
+class SnapshotReader:
+    """
+    Read-only access to a snapshot. Columns are memory-mapped on first use, so opening a snapshot
+    is cheap and only the pages that are touched are read from disk.
+    """
+
+    def __init__(self, path, verify=False):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.manifest.get('format_version')} in {path}")
+        if verify:
+            self.verify()
+        self._columns = {}
+
+    def verify(self):
+        """Raises ValueError if a column file does not match the checksum in the manifest."""
+        for name, info in self.manifest["columns"].items():
+            if _checksum(os.path.join(self.path, info["file"])) != info["sha256"]:
+                raise ValueError(f"Snapshot column {name} in {self.path} is corrupted")
+
+    def column(self, name):
+        if name not in self._columns:
+            info = self.manifest["columns"][name]
+            self._columns[name] = np.load(os.path.join(self.path, info["file"]), mmap_mode="r")
+        return self._columns[name]
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def companies(self):
+        return list(self.manifest["companies"])
+
+    def frame(self, company_ids=None):
+        """Long (company_id, year, metric, value) DataFrame, like Database.get_financials_frame."""
+        company_id = self.column("company_id")
+        mask = slice(None) if company_ids is None else np.isin(company_id, np.asarray(list(company_ids), dtype=np.int32))
+        metrics = np.asarray(self.manifest["metrics"], dtype=object)
+        return pd.DataFrame({
+            "company_id": company_id[mask].astype(np.int64),
+            "year": self.column("year")[mask].astype(np.int64),
+            "metric": metrics[self.column("metric")[mask]],
+            "value": np.asarray(self.column("value")[mask]),
+        })
+
+    def snapshot(self, company_id):
+        """metric x year frame of one company, like Database.get_financials_snapshot."""
+        return self.frame([company_id]).pivot(index="metric", columns="year", values="value").sort_index()
+
+    def cube(self, company_ids=None):
+        names = {c["id"]: c["name"] for c in self.manifest["companies"]}
+        return FinancialCube(self.frame(company_ids), names)
+
+
+def _import_companies(conn, companies):
+    """
+    Adds the snapshot's companies and returns {snapshot id: id in this database}. Companies are matched
+    by name first (names are unique), then keep their snapshot id if it is free, else get a new one.
+    """
+    ids_by_name = dict(conn.execute("SELECT name, id FROM companies").fetchall())
+    used_ids = set(ids_by_name.values())
+    id_map = {}
+    for company in companies:
+        company_id = ids_by_name.get(company["name"])
+        if company_id is not None:
+            conn.execute("UPDATE companies SET group_name = ? WHERE id = ?", (company["group_name"], company_id))
+        elif company["id"] not in used_ids:
+            conn.execute(
+                "INSERT INTO companies (id, name, group_name) VALUES (?, ?, ?)",
+                (company["id"], company["name"], company["group_name"])
+            )
+            company_id = company["id"]
+        else:
+            company_id = conn.execute(
+                "INSERT INTO companies (name, group_name) VALUES (?, ?)", (company["name"], company["group_name"])
+            ).lastrowid
+        used_ids.add(company_id)
+        id_map[company["id"]] = company_id
+    return id_map
+
+
+@traced("snapshot.import")
+def import_snapshot(db, path, replace=True, verify=True):
+    """
+    Loads a snapshot into db in a single transaction. Companies are matched by name, so ids that differ
+    between databases are remapped; with replace, financial_data is emptied first, otherwise snapshot
+    rows overwrite matching (company, year, metric) rows. Derived metrics are rebuilt and data versions
+    bumped in the same transaction. Returns the number of rows imported.
+    """
+    reader = SnapshotReader(path, verify=verify)
+    manifest = reader.manifest
+    metrics = np.asarray(manifest["metrics"], dtype=object)
+    sources = np.asarray(manifest["sources"] + [None], dtype=object)  # code -1 picks the trailing None
+    columns = (
+        reader.column("company_id").tolist(),
+        reader.column("year").tolist(),
+        metrics[reader.column("metric")].tolist(),
+        reader.column("value").tolist(),
+        sources[reader.column("source")].tolist(),
+    )
+
+    db.setup_database()
+    with db.get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            id_map = _import_companies(conn, manifest["companies"])
+            remapped = sum(old != new for old, new in id_map.items())
+            if remapped:
+                logger.info("Remapped %d company ids by name while importing %s", remapped, path)
+            rows = [(id_map.get(company_id, company_id), *rest) for company_id, *rest in zip(*columns)]
+            if replace:
+                conn.execute("DELETE FROM financial_data")
+            conn.executemany(
+                "INSERT OR REPLACE INTO financial_data (company_id, year, metric, value, source_document) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            refresh_derived_metrics(conn)
+            company_ids = [row[0] for row in conn.execute("SELECT id FROM companies")]
+            bump_data_versions(conn, [None, *company_ids])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    logger.info("Imported %d rows for %d companies into %s from %s", len(rows), len(manifest["companies"]), db.DB_PATH, path)
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("group_name")
+    export_parser.add_argument("--out")
+    import_parser = commands.add_parser("import")
+    import_parser.add_argument("group_name")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--merge", action="store_true", help="keep rows that are not in the snapshot")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = Database(args.group_name)
+    db.setup_database()
+    if args.command == "export":
+        manifest = export_snapshot(db, args.out)
+        print(f"{manifest['rows']} rows, {len(manifest['companies'])} companies, {len(manifest['metrics'])} metrics")
+    else:
+        print(f"{import_snapshot(db, args.path, replace=not args.merge)} rows imported")
+
+
+if __name__ == "__main__":
+    main()
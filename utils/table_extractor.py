@@ -0,0 +1,182 @@
+import re
+
+import pdfplumber
+
+from utils.tracing import traced
+
+# Labels that mean the same thing as each REQUIRED_KEYS metric, most specific first.
+SYNONYMS = {
+    "Revenue from Operations": ["revenue from operations", "income from operations", "revenue from operation", "net sales", "income from sales", "sales", "turnover"],
+    "Other Income": ["other income"],
+    "Total Income": ["total income", "total revenue"],
+    "Profit Before Tax": ["profit before tax", "profit before taxation", "profit loss before tax", "profit before tax and exceptional items"],
+    "Net Profit": ["profit for the year", "profit for the period", "net profit", "profit after tax", "net profit for the year", "profit loss for the year"],
+    "Total Equity": ["total equity", "shareholders funds", "total shareholders funds", "net worth"],
+    "Total Assets": ["total assets"],
+    "Total Liabilities": ["total liabilities"],
+    "Non-current assets": ["total non current assets", "non current assets"],
+    "Current assets": ["total current assets", "current assets"],
+    "Non-current liabilities": ["total non current liabilities", "non current liabilities"],
+    "Current liabilities": ["total current liabilities", "current liabilities"],
+    "Cash and cash equivalents": ["cash and cash equivalents", "cash and bank balances"],
+    "Earnings Per Share (Basic)": ["basic earnings per share", "earnings per share basic", "basic eps", "basic"],
+}
+
+# Too generic to match as a prefix: "sales returns" is not revenue, "basic weighted average shares" is not EPS.
+EXACT_ONLY_SYNONYMS = {"sales", "turnover", "basic"}
+
+# Per-share figures are never unit-scaled.
+UNSCALED_KEYS = {"Earnings Per Share (Basic)"}
+
+# Multipliers that bring a reported unit to crore, the unit most reports here use.
+UNIT_SCALES = [
+    (re.compile(r"\b(?:in\s+)?lakhs?\b|\blacs?\b"), 0.01),
+    (re.compile(r"\b(?:in\s+)?millions?\b|\bmn\b"), 0.1),
+    (re.compile(r"\b(?:in\s+)?crores?\b|\bcr\b"), 1.0),
+    (re.compile(r"\b(?:in\s+)?thousands?\b|['’‘]\s*000\b"), 0.0001),
+]
+
+CONFIDENCE_THRESHOLD = 0.75
+# A value read from an unidentified column; below the threshold so the LLM confirms it.
+FALLBACK_CONFIDENCE = 0.6
+
+# Year and period-end prefixes of header cells, e.g. "Year ended 31 March 2024", "As at".
+HEADER_PREFIX_RE = re.compile(r"^(?:for)?(?:the)?(?:year|period)ended|^as(?:at|on)")
+
+NUMBER_RE = re.compile(r"^\(?-?[\d,]*\.?\d+\)?$")
+NOTE_RE = re.compile(r"^\d{1,2}(?:\.\d{1,2})?[a-z]?$")
+
+
+def normalize_label(label):
+    label = re.sub(r"[^a-z ]", " ", label.lower().replace("&", " and "))
+    label = re.sub(r"\b(?:i|ii|iii|iv|v|vi|vii|viii|ix|x|a|b|c|d|e|note|notes)\b", " ", label)
+    return " ".join(label.split())
+
+
+def parse_number(text):
+    """Parses a table cell such as "1,234.50" or "(56.7)" into a float; returns None for anything else."""
+    if text is None:
+        return None
+    text = text.strip().replace(" ", "").replace("₹", "")
+    if not text or not NUMBER_RE.match(text):
+        return None
+    negative = text.startswith("(") and text.endswith(")")
+    value = float(text.strip("()").replace(",", ""))
+    return -value if negative else value
+
+
+def detect_unit_scale(text):
+    """Returns the multiplier to crore for the unit a page declares, or 1.0 if none is found."""
+    header = text.lower()[:1500]
+    for pattern, scale in UNIT_SCALES:
+        if pattern.search(header):
+            return scale
+    return 1.0
+
+
+def match_label(label):
+    """Returns (key, confidence) for a row label, or (None, 0)."""
+    normalized = normalize_label(label)
+    if not normalized:
+        return None, 0.0
+    for key, synonyms in SYNONYMS.items():
+        for synonym in synonyms:
+            if normalized == synonym:
+                return key, 1.0
+    for key, synonyms in SYNONYMS.items():
+        for synonym in synonyms:
+            if synonym in EXACT_ONLY_SYNONYMS:
+                continue
+            rest = normalized[len(synonym):].split() if normalized.startswith(synonym) else None
+            # Allow short qualifiers ("net", "total") but not a different line item ("... and liabilities").
+            if rest is not None and len(rest) <= 2 and "and" not in rest:
+                return key, 0.8
+    return None, 0.0
+
+
+def year_headers(year):
+    """
+    Header cells that name `year`. A year is the fiscal year ending in it, as in "year ended 31 March 2024":
+    2024 is FY 2023-24, never 2024-25.
+    """
+    yy, previous = str(year)[2:], year - 1
+    return {
+        str(year), f"{previous}-{yy}", f"{previous}-{year}",
+        f"fy{yy}", f"fy{year}", f"fy{previous}-{yy}", f"fy{previous}-{year}",
+        f"31.03.{year}", f"31-03-{year}", f"31/03/{year}", f"31march{year}", f"31stmarch{year}", f"march31{year}",
+    }
+
+
+def _normalize_header(cell):
+    cell = re.sub(r"[\s,]", "", cell.lower()).replace("–", "-")
+    return HEADER_PREFIX_RE.sub("", cell)
+
+
+def _year_column(table, year):
+    """Index of the column whose whole header cell names the requested year, searching the first few rows."""
+    headers = year_headers(year)
+    for row in table[:4]:
+        for index, cell in enumerate(row):
+            if cell and _normalize_header(cell) in headers:
+                return index
+    return None
+
+
+def _row_value(row, year_column):
+    if year_column is not None and year_column < len(row):
+        value = parse_number(row[year_column])
+        if value is not None:
+            return value, 1.0
+    numbers = [(i, parse_number(cell)) for i, cell in enumerate(row[1:], start=1)]
+    numbers = [(i, v) for i, v in numbers if v is not None]
+    # A leading small integer followed by two figures is a note reference, not a value.
+    if len(numbers) >= 3 and NOTE_RE.match((row[numbers[0][0]] or "").strip()):
+        numbers = numbers[1:]
+    if not numbers:
+        return None, 0.0
+    return numbers[0][1], FALLBACK_CONFIDENCE
+
+
+@traced("extract_table_metrics")
+def extract_table_metrics(pdf_path, year, page_numbers=None, keys=None):
+    """
+    Extracts REQUIRED_KEYS metrics from the tables on the given (1-based) PDF pages with pdfplumber.
+    Returns {key: {"value", "confidence", "page", "label"}} holding the best candidate for each key found.
+    Consolidated statements win over standalone ones at equal confidence.
+    """
+    wanted = set(keys or SYNONYMS)
+    results = {}
+    with pdfplumber.open(pdf_path) as pdf:
+        numbers = page_numbers or range(1, len(pdf.pages) + 1)
+        for page_number in numbers:
+            if not 1 <= page_number <= len(pdf.pages):
+                continue
+            page = pdf.pages[page_number - 1]
+            text = page.extract_text() or ""
+            scale = detect_unit_scale(text)
+            consolidated = "consolidated" in text.lower()
+            for table in page.extract_tables():
+                year_column = _year_column(table, year)
+                for row in table:
+                    if not row or not row[0]:
+                        continue
+                    key, label_confidence = match_label(row[0])
+                    if key not in wanted:
+                        continue
+                    value, value_confidence = _row_value(row, year_column)
+                    if value is None:
+                        continue
+                    if key not in UNSCALED_KEYS:
+                        value *= scale
+                    candidate = {
+                        "value": value,
+                        "confidence": round(label_confidence * value_confidence, 3),
+                        "page": page_number,
+                        "label": row[0].strip(),
+                        "consolidated": consolidated,
+                    }
+                    best = results.get(key)
+                    if best is None or (candidate["confidence"], candidate["consolidated"]) > (best["confidence"], best["consolidated"]):
+                        results[key] = candidate
+            page.close()
+    return results
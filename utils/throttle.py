@@ -0,0 +1,107 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Takes tokens if available and returns 0, otherwise returns the seconds to wait."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def pause(self, seconds):
+        """Empties the bucket so nothing is granted for about `seconds`, e.g. after a 429."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def acquire(self, tokens=1):
+        """Blocks until tokens are available; returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class CallLimiter:
+    """
+    Caps concurrent upstream calls and paces them through a token bucket, shared by every
+    caller in the process. Keeps in-flight/queued gauges and totals for monitoring.
+    """
+
+    def __init__(self, max_concurrent, requests_per_minute):
+        self.max_concurrent = max_concurrent
+        self.bucket = TokenBucket(requests_per_minute / 60.0, capacity=max(1, requests_per_minute // 6))
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+
+    @contextmanager
+    def slot(self):
+        start = time.monotonic()
+        with self._lock:
+            self.queued += 1
+        try:
+            self._slots.acquire()
+            try:
+                self.bucket.acquire()
+            except BaseException:
+                self._slots.release()
+                raise
+        finally:
+            with self._lock:
+                self.queued -= 1
+                self.wait_seconds += time.monotonic() - start
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        else:
+            with self._lock:
+                self.completed += 1
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "max_concurrent": self.max_concurrent,
+                "requests_per_minute": round(self.bucket.rate * 60),
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
@@ -0,0 +1,199 @@
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Tracing is off unless FINANCIA_TRACE is set; FINANCIA_TRACE_FILE also appends every span to a JSON-lines file.
+TRACE_ENABLED = os.getenv("FINANCIA_TRACE", "").lower() in ("1", "true", "yes", "on")
+TRACE_FILE = os.getenv("FINANCIA_TRACE_FILE")
+MAX_SPANS = 2000
+
+
+class Span:
+    """One timed operation. Attributes can be added while it runs with set()."""
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.id = next(tracer._ids)
+        self.parent_id = None
+        self.start = 0.0
+        self.duration = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent_id = stack[-1].id if stack else None
+        stack.append(self)
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._perf_start
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "thread": threading.current_thread().name,
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled, so instrumented code pays for one attribute check."""
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Process-wide collector of spans and counters. Keeps the last max_spans spans in memory,
+    per-name aggregates (count, total, max, errors) and optionally appends spans to a JSONL file.
+    """
+
+    def __init__(self, enabled=TRACE_ENABLED, max_spans=MAX_SPANS, export_path=TRACE_FILE):
+        self.enabled = enabled
+        self.export_path = export_path
+        self._spans = deque(maxlen=max_spans)
+        self._stats = {}
+        self._counters = {}
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def record(self, name, duration, error=None, **attrs):
+        """Adds a span measured elsewhere, e.g. across the yields of a generator."""
+        if not self.enabled:
+            return
+        finished = Span(self, name, attrs)
+        stack = self._stack()
+        finished.parent_id = stack[-1].id if stack else None
+        finished.start = time.time() - duration
+        finished.duration = duration
+        finished.error = error
+        self._finish(finished)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish(self, span):
+        record = span.to_dict()
+        with self._lock:
+            self._spans.append(record)
+            stats = self._stats.setdefault(span.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+            stats["count"] += 1
+            stats["total_ms"] += record["duration_ms"]
+            stats["max_ms"] = max(stats["max_ms"], record["duration_ms"])
+            stats["errors"] += span.error is not None
+            if self.export_path:
+                try:
+                    with open(self.export_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, default=str) + "\n")
+                except OSError as e:
+                    logger.warning("Could not export span to %s: %s", self.export_path, e)
+
+    def summary(self):
+        """Per-span-name aggregates, slowest total first."""
+        with self._lock:
+            rows = [
+                dict(name=name, mean_ms=round(s["total_ms"] / s["count"], 3), **{k: round(v, 3) for k, v in s.items()})
+                for name, s in self._stats.items()
+            ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def recent(self, limit=200):
+        with self._lock:
+            return list(self._spans)[-limit:]
+
+    def to_jsonl(self):
+        """The buffered spans as JSON lines, e.g. for a download button."""
+        return "".join(json.dumps(record, default=str) + "\n" for record in self.recent(len(self._spans)))
+
+    def export_jsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_jsonl())
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+            self._stats.clear()
+            self._counters.clear()
+
+
+tracer = Tracer()
+
+
+def span(name, **attrs):
+    """Context manager timing a block: `with span("db.save", rows=10) as s: ... s.set(inserted=n)`."""
+    return tracer.span(name, **attrs)
+
+
+def count(name, value=1):
+    tracer.count(name, value)
+
+
+def traced(name=None):
+    """Decorator that wraps every call of a function in a span (a plain call while tracing is disabled)."""
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with Span(tracer, span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
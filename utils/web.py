@@ -0,0 +1,184 @@
+import codecs
+import hashlib
+import re
+import threading
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.locator import build_lexicon, tokenize
+
+MAX_BYTES = 10 * 1024 * 1024
+MAX_TEXT_CHARS = 200_000
+TIMEOUT = (5, 30)  # (connect, read) seconds
+CHUNK_SIZE = 64 * 1024
+USER_AGENT = "Mozilla/5.0 (compatible; financia/1.0)"
+
+NUMBER_RE = re.compile(r"^\(?-?[\d,]+(?:\.\d+)?\)?%?$")
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+BLOCK_TAGS = {"p", "div", "br", "li", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "tr"}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+def get_session():
+    """Returns the process-wide requests session with pooled connections and retries on 5xx."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = USER_AGENT
+                _session = session
+    return _session
+
+
+class TableExtractor(HTMLParser):
+    """
+    Incremental HTML parser that keeps <table> contents as rows of cell strings, and a bounded
+    amount of the remaining visible text as a fallback for pages without tables.
+    """
+
+    def __init__(self, max_text_chars=MAX_TEXT_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.tables = []
+        self.text_lines = []
+        self.max_text_chars = max_text_chars
+        self._text_chars = 0
+        self._skip_depth = 0
+        self._stack = []  # one [rows, row, cell] entry per open table
+        self._line = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "table":
+            self._stack.append([[], None, None])
+        elif self._stack:
+            table = self._stack[-1]
+            if tag == "tr":
+                self._end_row(table)
+                table[1] = []
+            elif tag in ("td", "th"):
+                self._end_cell(table)
+                if table[1] is None:
+                    table[1] = []
+                table[2] = []
+        elif tag in BLOCK_TAGS:
+            self._end_line()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "table" and self._stack:
+            table = self._stack.pop()
+            self._end_row(table)
+            if table[0]:
+                self.tables.append(table[0])
+        elif self._stack:
+            table = self._stack[-1]
+            if tag in ("td", "th"):
+                self._end_cell(table)
+            elif tag == "tr":
+                self._end_row(table)
+        elif tag in BLOCK_TAGS:
+            self._end_line()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._stack:
+            cell = self._stack[-1][2]
+            if cell is not None:
+                cell.append(data)
+        elif self._text_chars < self.max_text_chars:
+            self._line.append(data)
+
+    def close(self):
+        super().close()
+        while self._stack:
+            self.handle_endtag("table")
+        self._end_line()
+
+    def _end_cell(self, table):
+        if table[2] is not None:
+            table[1].append(" ".join("".join(table[2]).split()))
+            table[2] = None
+
+    def _end_row(self, table):
+        self._end_cell(table)
+        if table[1]:
+            if any(table[1]):
+                table[0].append(table[1])
+            table[1] = None
+
+    def _end_line(self):
+        line = " ".join("".join(self._line).split())
+        self._line = []
+        if line and self._text_chars < self.max_text_chars:
+            self.text_lines.append(line)
+            self._text_chars += len(line)
+
+
+def looks_financial(rows, lexicon, min_numeric_ratio=0.25, min_terms=2):
+    """A table is kept if enough of its cells are numbers and its labels use the financial vocabulary."""
+    cells = [cell for row in rows for cell in row if cell]
+    if not cells:
+        return False
+    numeric = sum(1 for cell in cells if NUMBER_RE.match(cell.replace(" ", "")))
+    terms = {token for row in rows for cell in row for token in tokenize(cell) if token in lexicon}
+    return numeric / len(cells) >= min_numeric_ratio and len(terms) >= min_terms
+
+
+def tables_to_text(tables):
+    """Compact rendering of table rows, one pipe-separated row per line and a blank line between tables."""
+    return "\n\n".join("\n".join(" | ".join(cell for cell in row if cell) for row in table) for table in tables)
+
+
+def fetch_financial_tables(url, keys, max_bytes=MAX_BYTES, timeout=TIMEOUT):
+    """
+    Streams a web page with size and time limits, parsing it incrementally, and returns the
+    tables that look like financial statements. The result includes the content hash of the body,
+    a compact text rendering for the LLM, and fetch statistics.
+    """
+    lexicon = build_lexicon(keys)
+    parser = TableExtractor()
+    digest = hashlib.sha256()
+    received = 0
+
+    with get_session().get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ResponseTooLarge(f"{url} is {int(declared)} bytes, over the {max_bytes} byte limit")
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            received += len(chunk)
+            if received > max_bytes:
+                raise ResponseTooLarge(f"{url} exceeded the {max_bytes} byte limit")
+            digest.update(chunk)
+            parser.feed(decoder.decode(chunk))
+        parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+
+    tables = [rows for rows in parser.tables if looks_financial(rows, lexicon)]
+    text = tables_to_text(tables) if tables else "\n".join(parser.text_lines)
+    return {
+        "content_hash": digest.hexdigest(),
+        "tables": tables,
+        "text": text,
+        "bytes": received,
+        "tables_seen": len(parser.tables),
+        "tables_kept": len(tables),
+    }